@@ -0,0 +1,192 @@
+# Preprocessed asset cache and the process-wide registry of loaded images shared by every Game
+import json
+import os
+import struct
+import time
+import pygame
+from config import *
+from atlas import SpriteAtlas
+from rotation_cache import RotationCache
+from text_cache import TextCache
+from audio_manager import AudioManager
+
+# Bumped whenever the way cached images are built changes, so stale files are ignored rather than misread
+ASSET_CACHE_VERSION = 1
+ASSET_CACHE_MAGIC = b'EFHASSET'
+
+# Attack sprites: type, source image, colour key, and whether the image keeps per-pixel alpha
+ATTACK_IMAGES = [
+    ('sword_swing', 'img/rogue_skill2_frame2.png', BLACK, True),
+    ('dagger', 'img/rogue_skill4_frame4.png', BLACK, True),
+    ('fireball', 'img/shot_fireball.png', WHITE, False)
+]
+
+
+class AssetCache: # Initialize a cache of built images backed by one binary file, reading whatever an earlier launch stored
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.pixels = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.read()
+
+    def read(self): # Load the cache file's index and pixel data, starting empty if it is missing, stale or damaged
+        try:
+            with open(self.path, 'rb') as cache_file:
+                if cache_file.read(len(ASSET_CACHE_MAGIC)) != ASSET_CACHE_MAGIC:
+                    return
+                header_size, = struct.unpack('<I', cache_file.read(4))
+                header = json.loads(cache_file.read(header_size).decode('utf-8'))
+                if header.get('version') != ASSET_CACHE_VERSION:
+                    return
+                data = cache_file.read()
+
+            entries = {}
+            for key, entry in header['entries'].items():
+                images = []
+                for image in entry['images']:
+                    pixels = data[image['offset']:image['offset'] + image['length']]
+                    # A file cut short mid-blob leaves the entry without its pixels, so it is rebuilt instead
+                    if len(pixels) != image['length']:
+                        break
+                    images.append(dict(image, pixels=pixels))
+                else:
+                    entries[key] = {'stamp': entry['stamp'], 'images': images}
+        except (OSError, ValueError, struct.error, KeyError, TypeError, AttributeError):
+            return
+        self.entries = entries
+
+    def stamp(self, sources): # Fingerprint source files by modification time and size
+        stamp = []
+        for source in sources:
+            try:
+                status = os.stat(source)
+                stamp.append([source, status.st_mtime_ns, status.st_size])
+            except OSError:
+                stamp.append([source, None, None])
+        return stamp
+
+    def images(self, key, sources, build): # Return the images stored under key, calling build() for them only if a source changed
+        stamp = self.stamp(sources)
+        entry = self.entries.get(key)
+        if entry is not None and entry['stamp'] == stamp:
+            try:
+                surfaces = [self.restore(image) for image in entry['images']]
+                self.hits += 1
+                return surfaces
+            except (ValueError, TypeError, KeyError):
+                pass # Pixels that no longer fit the stored size are treated as a miss
+
+        self.misses += 1
+        surfaces = build()
+        self.entries[key] = {'stamp': stamp, 'images': [self.pack(surface) for surface in surfaces]}
+        self.dirty = True
+        return surfaces
+
+    def pack(self, surface): # Describe a surface as raw pixels plus the settings needed to rebuild it
+        alpha = bool(surface.get_flags() & pygame.SRCALPHA)
+        pixel_format = 'RGBA' if alpha else 'RGB'
+        colorkey = surface.get_colorkey()
+        return {
+            'size': list(surface.get_size()),
+            'format': pixel_format,
+            'colorkey': list(colorkey) if colorkey else None,
+            'pixels': pygame.image.tobytes(surface, pixel_format)
+        }
+
+    def restore(self, image): # Rebuild a display-ready surface from packed pixels
+        surface = pygame.image.frombytes(image['pixels'], tuple(image['size']), image['format'])
+        surface = surface.convert_alpha() if image['format'] == 'RGBA' else surface.convert()
+        if image['colorkey']:
+            surface.set_colorkey(image['colorkey'])
+        return surface
+
+    def save(self): # Write the cache file if anything was built this run, replacing the old file in one step
+        if not self.dirty:
+            return
+
+        entries = {}
+        blobs = []
+        offset = 0
+        for key, entry in self.entries.items():
+            images = []
+            for image in entry['images']:
+                images.append({
+                    'size': image['size'],
+                    'format': image['format'],
+                    'colorkey': image['colorkey'],
+                    'offset': offset,
+                    'length': len(image['pixels'])
+                })
+                blobs.append(image['pixels'])
+                offset += len(image['pixels'])
+            entries[key] = {'stamp': entry['stamp'], 'images': images}
+
+        header = json.dumps({'version': ASSET_CACHE_VERSION, 'entries': entries}).encode('utf-8')
+        temporary_path = self.path + '.tmp'
+        try:
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(ASSET_CACHE_MAGIC)
+                cache_file.write(struct.pack('<I', len(header)))
+                cache_file.write(header)
+                for blob in blobs:
+                    cache_file.write(blob)
+            os.replace(temporary_path, self.path)
+            self.dirty = False
+        except OSError:
+            pass
+
+
+class AssetRegistry: # Initialize the images, fonts, music and caches that stay loaded for the life of the process
+    def __init__(self):
+        start = time.perf_counter()
+        self.cache = AssetCache(ASSET_CACHE_PATH)
+        self.atlas = SpriteAtlas('img/32rogues', self.cache)
+        self.text = TextCache()
+        self.audio = None
+
+        # Rotated copies would make the cache file several times larger than rotating them does, so only the
+        # base images are cached and each angle bucket is rendered the first time an attack uses it
+        self.attack_rotations = RotationCache(ATTACK_ROTATION_STEPS)
+        for attack_type, source, colorkey, alpha in ATTACK_IMAGES:
+            image, = self.cache.images(f"attack:{attack_type}", [source],
+                                       lambda: [self.load_attack_image(source, colorkey, alpha)])
+            self.attack_rotations.add(attack_type, image)
+
+        self.timings = {'registry_ms': (time.perf_counter() - start) * 1000}
+
+    def load_attack_image(self, source, colorkey, alpha): # Decode an attack image the way the game draws it
+        if alpha:
+            image = pygame.image.load(source).convert_alpha()
+        else:
+            image = Spritesheet(source).get_sprite(0, 0, TILESIZE, TILESIZE)
+        image.set_colorkey(colorkey)
+        return image
+
+    def shared_audio(self): # Return the music manager, opening the mixer the first time a Game with sound asks for it
+        if self.audio is None:
+            self.audio = AudioManager()
+        return self.audio
+
+
+class Spritesheet: # Initialize a spritesheet object with the given image file
+    def __init__(self, file):
+        self.sheet = pygame.image.load(file).convert()
+
+    def get_sprite(self, x, y, width, height): # Extract a sprite from the spritesheet at the specified coordinates and dimensions
+        sprite = pygame.Surface([width, height])
+        sprite.blit(self.sheet, (0,0), (x, y, width, height))
+        sprite.set_colorkey(BLACK)
+        return sprite
+
+
+shared_registry = None
+
+
+def shared_assets(): # Return the process-wide asset registry, building it the first time a Game asks
+    global shared_registry
+    if shared_registry is None:
+        shared_registry = AssetRegistry()
+    return shared_registry
@@ -0,0 +1,75 @@
+# Sprite atlas that addresses the 32rogues sheets by the names in their .txt manifests
+import os
+import re
+import pygame
+from config import *
+
+# Manifest entries look like "12.c. blank red floor": row number, column letter, then the sprite's name
+MANIFEST_ENTRY = re.compile(r'^(\d+)\.([a-z])\.\s+(.+?)\s*$')
+
+
+class SpriteAtlas: # Initialize an atlas over a directory of sheets, loading nothing until a sprite is first asked for
+    def __init__(self, directory, cache=None, tile_size=TILESIZE):
+        self.directory = directory
+        self.cache = cache
+        self.tile_size = tile_size
+        self.sheets = {}
+        self.manifests = {}
+        self.sprites = {}
+
+    def sheet(self, sheet_name): # Return a sheet's image, decoding the file the first time the sheet is used
+        sheet = self.sheets.get(sheet_name)
+        if sheet is None:
+            image = pygame.image.load(self.path(sheet_name, '.png')).convert()
+
+            # Flatten the sheet's own transparent colour onto black, so one BLACK colour key works for every sprite
+            sheet = pygame.Surface(image.get_size()).convert()
+            sheet.fill(BLACK)
+            sheet.blit(image, (0, 0))
+            self.sheets[sheet_name] = sheet
+        return sheet
+
+    def path(self, sheet_name, extension): # Return the file a sheet's image or manifest is stored in
+        return os.path.join(self.directory, sheet_name + extension)
+
+    def manifest(self, sheet_name): # Return a sheet's name-to-cell table, parsing its manifest the first time
+        manifest = self.manifests.get(sheet_name)
+        if manifest is None:
+            manifest = {}
+            with open(self.path(sheet_name, '.txt')) as manifest_file:
+                for line in manifest_file:
+                    entry = MANIFEST_ENTRY.match(line)
+                    if not entry:
+                        continue
+                    row, letter, name = int(entry.group(1)), entry.group(2), entry.group(3)
+                    cell = (ord(letter) - ord('a'), row - 1)
+
+                    # Names repeat in a few manifests, so the first one wins and the "row.letter" code always works
+                    manifest.setdefault(name, cell)
+                    manifest[f"{row}.{letter}"] = cell
+            self.manifests[sheet_name] = manifest
+        return manifest
+
+    def sprite(self, sheet_name, name): # Return the shared tile-sized sprite a manifest names, e.g. ('monsters', 'goblin')
+        cell = self.manifest(sheet_name).get(name)
+        if cell is None:
+            raise KeyError(f"No sprite named '{name}' in {sheet_name}.txt")
+        return self.region(sheet_name, cell[0] * self.tile_size, cell[1] * self.tile_size)
+
+    def cut(self, key): # Return a view of the sheet area a region key describes
+        sprite = self.sheet(key[0]).subsurface(pygame.Rect(key[1:]))
+        sprite.set_colorkey(BLACK)
+        return sprite
+
+    def region(self, sheet_name, x, y, width=None, height=None): # Return the shared sprite at a pixel area of a sheet, for art the manifests do not list
+        key = (sheet_name, x, y, width or self.tile_size, height or self.tile_size)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if self.cache is None:
+                sprite = self.cut(key)
+            else:
+                # A cached slice is rebuilt on its own, so launches that find every slice cached never decode the sheet
+                cache_key = "sprite:{}:{}:{}:{}:{}".format(*key)
+                sprite, = self.cache.images(cache_key, [self.path(sheet_name, '.png')], lambda: [self.cut(key).copy()])
+            self.sprites[key] = sprite
+        return sprite
@@ -0,0 +1,99 @@
+# Level music that is decoded on a background thread and crossfaded in, so level transitions never wait on audio
+import pygame
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+
+
+class AudioManager: # Initialize the mixer if there is one, falling back to silence when there is no audio device or audio is disabled
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        if enabled:
+            try:
+                if not pygame.mixer.get_init():
+                    pygame.mixer.init()
+            except pygame.error:
+                self.enabled = False
+
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='music') if self.enabled else None
+        self.tracks = {}
+        self.channel = None
+        self.current_track = None
+        self.pending_track = None
+
+    def track_for(self, level): # Return the (file, start seconds) entry a level plays, using level 1's track for unknown levels
+        return LEVEL_MUSIC.get(level, LEVEL_MUSIC[1])
+
+    def prefetch(self, level): # Start decoding a level's track in the background unless it is already loaded or loading
+        if not self.enabled:
+            return
+        track = self.track_for(level)
+        if track not in self.tracks:
+            self.tracks[track] = self.loader.submit(self.decode, *track)
+
+    def decode(self, path, start): # Decode a whole track into memory, trimmed to begin at its start offset, or None if it cannot be read
+        try:
+            sound = pygame.mixer.Sound(path)
+        except (pygame.error, OSError):
+            return None
+        if not start:
+            return sound
+
+        # The sound's own buffer has one row per frame in whatever sample format the mixer runs, so its stride is the
+        # frame size, and slicing the view instead of get_raw() leaves the only copy to the trimmed Sound itself
+        frequency = pygame.mixer.get_init()[0]
+        samples = memoryview(sound)
+        offset = int(start * frequency) * samples.strides[0]
+        samples = samples.cast('B')
+        if offset >= len(samples):
+            return sound
+        return pygame.mixer.Sound(buffer=samples[offset:])
+
+    def play(self, level): # Switch to a level's track, crossfading once it has finished decoding
+        if not self.enabled:
+            return
+        track = self.track_for(level)
+        if track == self.current_track and self.pending_track is None:
+            return
+        self.prefetch(level)
+        self.pending_track = track
+        self.update()
+
+    def update(self): # Start the pending track if its decode has finished, without ever waiting for it
+        if self.pending_track is None:
+            return
+        loading = self.tracks[self.pending_track]
+        if not loading.done():
+            return
+
+        track = self.pending_track
+        self.pending_track = None
+        if track == self.current_track and self.channel is not None and self.channel.get_busy():
+            return
+
+        # A decode that failed in the worker is treated like a missing file, the level just plays in silence
+        self.fade_out()
+        try:
+            sound = loading.result()
+        except Exception:
+            sound = None
+        if sound is not None:
+            self.channel = sound.play(loops=-1, fade_ms=MUSIC_CROSSFADE_MS)
+        self.current_track = track
+
+        # Only the playing track stays decoded; anything else still loading is kept for when it is asked for
+        for other in list(self.tracks):
+            if other != track and self.tracks[other].done():
+                del self.tracks[other]
+
+    def fade_out(self): # Fade the playing track out over the crossfade time
+        if self.channel is not None:
+            self.channel.fadeout(MUSIC_CROSSFADE_MS)
+            self.channel = None
+        self.current_track = None
+
+    def stop(self): # Silence the music immediately and drop any switch that was waiting on a decode
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
+        self.current_track = None
+        self.pending_track = None
@@ -0,0 +1,38 @@
+# Camera that maps world coordinates to the screen at draw time and culls what lies outside the view
+from config import *
+
+
+class Camera: # Initialize a camera with a view the size of the screen, positioned in world coordinates
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.offset_x = 0
+        self.offset_y = 0
+        self.blend = 1.0
+
+    def follow(self, world_x, world_y): # Center the view on a tile-sized sprite at the given world position
+        self.offset_x = world_x - self.width // 2 + TILESIZE // 2
+        self.offset_y = world_y - self.height // 2 + TILESIZE // 2
+
+    def position(self, sprite): # Return where a sprite is drawn this frame, blend of the way from its previous tick to its latest
+        if not hasattr(sprite, 'tick_x'):
+            return sprite.world_x, sprite.world_y
+        return (sprite.tick_x + (sprite.world_x - sprite.tick_x) * self.blend,
+                sprite.tick_y + (sprite.world_y - sprite.tick_y) * self.blend)
+
+    def sees(self, world_x, world_y, width, height): # Check if a world-space box overlaps the view
+        return (world_x < self.offset_x + self.width and self.offset_x < world_x + width and
+                world_y < self.offset_y + self.height and self.offset_y < world_y + height)
+
+    def to_screen(self, world_x, world_y): # Convert a world position to whole screen pixels
+        return int(world_x - self.offset_x), int(world_y - self.offset_y)
+
+    def to_world(self, screen_x, screen_y): # Convert a screen position, such as the mouse, back to world coordinates
+        return screen_x + self.offset_x, screen_y + self.offset_y
+
+    def draw_sprites(self, surface, sprites): # Blit each sprite that overlaps the view at its interpolated camera-space position
+        for sprite in sprites:
+            world_x, world_y = self.position(sprite)
+            width, height = sprite.image.get_size()
+            if self.sees(world_x, world_y, width, height):
+                surface.blit(sprite.image, self.to_screen(world_x, world_y))
@@ -6,7 +6,12 @@ import random
 WW = 1280
 WH = 720
 TILESIZE = 32
-FPS = 60
+
+# Gameplay advances in fixed ticks at SIM_RATE per second, frames are drawn at RENDER_RATE and interpolate between ticks
+SIM_RATE = 60
+RENDER_RATE = 60
+# Most ticks a frame may run to catch up after a slow frame; past that the game slows down rather than stalling
+MAX_SIM_STEPS = 5
 
 # Layer settings for sprite rendering order and speed settings
 PLAYER_LAYER = 4
@@ -16,6 +21,45 @@ GROUND_LAYER = 1
 PLAYER_SPEED = 3
 ENEMY_SPEED = 4
 
+# Enemy pathfinding: 'flowfield' shares one search toward the player, 'astar' and 'jps' search per enemy,
+# 'incremental' gives each enemy a planner that repairs its last search as the player moves
+ENEMY_PATHFINDING = 'flowfield'
+# JPS pops fewer nodes than A* on the 4-connected boss maps but scans 2-3x more cells, so boss waves stay on A*
+BOSS_PATHFINDING = 'astar'
+PATHFINDING_BUDGET_MS = 1.0
+# Seeded and recorded runs answer a fixed number of path requests per tick instead, so a replay plans identically
+PATHFINDING_REQUESTS_PER_TICK = 8
+
+# Step every enemy's movement together in NumPy arrays instead of one enemy at a time, meant for waves of hundreds
+ENEMY_CROWD_BATCHING = False
+
+# How strongly enemies brushing past a wall steer away from it, as a fraction of their top speed
+ENEMY_WALL_AVOIDANCE = 0.35
+
+# Enemy line of sight: 'visibility' reads the player's shadowcast visibility map, 'ray' traces each enemy's own ray
+ENEMY_LINE_OF_SIGHT = 'visibility'
+
+# Number of angles attack sprites are pre-rotated to, attacks snap to the nearest one
+ATTACK_ROTATION_STEPS = 64
+
+# Sprites sliced from the sheets and the attack images are stored here between launches; delete the file to rebuild it
+ASSET_CACHE_PATH = 'asset_cache.bin'
+SHOW_STARTUP_TIMINGS = False
+
+# Record each run's per-tick input so it can be replayed exactly with `python headless.py --replay <file>`
+RECORD_INPUT = False
+RECORDINGS_DIR = 'recordings'
+
+# Music per level as (file, seconds to start into the track); levels without an entry play level 1's
+LEVEL_MUSIC = {
+    1: ('audio/Macky Gee - Obsessive.mp3', 37),
+    2: ('audio/Macky Gee - Moments.mp3', 60),
+    3: ('audio/Macky Gee - Tour.mp3', 61),
+    4: ('audio/Macky Gee Ft. Stuart Rowe - Aftershock.mp3', 170),
+    5: ('audio/Nettspend - Nothing Like U (Official Music Video).mp3', 0)
+}
+MUSIC_CROSSFADE_MS = 1500
+
 # Color definitions (RGB format)
 RED = (255, 0, 0)
 BLACK = (0, 0, 0)
@@ -24,7 +68,7 @@ LIGHTGREY = (150, 150, 150)
 WHITE = (255, 255, 255)
 
 
-def generate_shaped_map(width, height, shape_type='rectangle'): # Function to procedurally generate a game map with specified shape and obstacles
+def generate_shaped_map(width, height, shape_type='rectangle', rng=random): # Function to procedurally generate a game map with specified shape and obstacles
     map = [['B' for _ in range(width)] for _ in range(height)]
 
     # Create the main playable area based on shape_type
@@ -45,14 +89,14 @@ def generate_shaped_map(width, height, shape_type='rectangle'): # Function to pr
                 if distance < radius:
                     map[y][x] = '.'
 
-    num_shapes = random.randint(3, 7)
+    num_shapes = rng.randint(3, 7)
 
     # Add random block shapes within the playable area
     for _ in range(num_shapes):
         attempts = 0
         while attempts < 100:
-            start_x = random.randint(5, width - 6)
-            start_y = random.randint(5, height - 6)
+            start_x = rng.randint(5, width - 6)
+            start_y = rng.randint(5, height - 6)
             if map[start_y][start_x] == '.':
                 break
             attempts += 1
@@ -61,7 +105,7 @@ def generate_shaped_map(width, height, shape_type='rectangle'): # Function to pr
             continue
 
         # Chooses a random shape size
-        shape_size = random.randint(10, 20)
+        shape_size = rng.randint(10, 20)
         blocks_placed = 0
         blocks = [(start_x, start_y)]
 
@@ -72,13 +116,13 @@ def generate_shaped_map(width, height, shape_type='rectangle'): # Function to pr
                 blocks_placed += 1
 
                 directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-                random.shuffle(directions)
+                rng.shuffle(directions)
 
                 for dx, dy in directions:
                     nx, ny = x + dx, y + dy
                     if (0 < nx < width - 1 and 0 < ny < height - 1 and
                             map[ny][nx] == '.' and
-                            random.random() < 0.7):
+                            rng.random() < 0.7):
                         blocks.append((nx, ny))
 
     px, py = width // 2, height // 2
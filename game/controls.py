@@ -0,0 +1,57 @@
+# Player input sources: the live keyboard and mouse, or a script that decides each tick's input
+import pygame
+
+
+class HeldKeys: # Initialize a key state that answers keys[pygame.K_x] like pygame.key.get_pressed() does
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class KeyboardControls: # Initialize input read live from pygame's keyboard and mouse once per tick
+    def __init__(self):
+        self.keys = HeldKeys()
+        self.target = (0, 0)
+        self.attack = False
+        self.clicked = False
+
+    def click(self): # Note an attack click from Game.events, so the next tick carries it out
+        self.clicked = True
+
+    def poll(self, game): # Read this tick's held keys, the world position under the mouse and any pending click
+        self.keys = pygame.key.get_pressed()
+        self.target = game.camera.to_world(*pygame.mouse.get_pos())
+        self.attack = self.clicked
+        self.clicked = False
+
+    def pressed(self): # Return the keys held this tick
+        return self.keys
+
+    def aim(self): # Return the world position attacks are aimed at this tick
+        return self.target
+
+
+class ScriptedControls: # Initialize input decided by script(game) each tick, which returns (held keys, world aim, attack)
+    def __init__(self, script):
+        self.script = script
+        self.keys = HeldKeys()
+        self.target = (0, 0)
+        self.attack = False
+
+    def click(self): # Scripts decide their own attacks, so clicks from the event queue are ignored
+        pass
+
+    def poll(self, game): # Ask the script for this tick's input, keeping the last aim when it gives none
+        keys, target, attack = self.script(game)
+        self.keys = HeldKeys(keys)
+        if target is not None:
+            self.target = target
+        self.attack = attack
+
+    def pressed(self): # Return the keys the script holds this tick
+        return self.keys
+
+    def aim(self): # Return the world position the script aims at
+        return self.target
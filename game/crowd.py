@@ -0,0 +1,167 @@
+# Batched enemy movement that keeps every enemy's kinematics in contiguous NumPy arrays
+import numpy
+from config import *
+from sprites import Enemy, BatchedEnemy
+
+# Per-enemy arrays, each row belongs to the enemy in the same slot of Crowd.members
+CROWD_ARRAYS = ('position', 'velocity', 'target', 'has_target', 'max_speed', 'acceleration', 'deceleration')
+
+# Enemy attributes that BatchedEnemy keeps in those arrays
+CROWD_ATTRIBUTES = ('world_x', 'world_y', 'velocity_x', 'velocity_y', 'max_speed', 'acceleration', 'deceleration')
+
+# Packing for a cell's (x, y) into one sortable key, wide enough for any map plus off-map drift
+CELL_KEY_OFFSET = 1 << 15
+CELL_KEY_STRIDE = 1 << 16
+
+
+class Crowd: # Initialize empty arrays for the position, velocity and steering settings of batched enemies
+    def __init__(self, capacity=64):
+        self.members = []
+        self.position = numpy.zeros((capacity, 2))
+        self.velocity = numpy.zeros((capacity, 2))
+        self.target = numpy.zeros((capacity, 2))
+        self.has_target = numpy.zeros(capacity, dtype=bool)
+        self.max_speed = numpy.zeros(capacity)
+        self.acceleration = numpy.zeros(capacity)
+        self.deceleration = numpy.zeros(capacity)
+
+    def add(self, enemy): # Copy an enemy's movement state into the next free slot and make its attributes read through to it
+        slot = len(self.members)
+        if slot == len(self.position):
+            for name in CROWD_ARRAYS:
+                array = getattr(self, name)
+                grown = numpy.zeros((len(array) * 2,) + array.shape[1:], dtype=array.dtype)
+                grown[:slot] = array
+                setattr(self, name, grown)
+
+        self.position[slot] = (enemy.world_x, enemy.world_y)
+        self.velocity[slot] = (enemy.velocity_x, enemy.velocity_y)
+        self.has_target[slot] = False
+        self.max_speed[slot] = enemy.max_speed
+        self.acceleration[slot] = enemy.acceleration
+        self.deceleration[slot] = enemy.deceleration
+
+        # From here the enemy's movement attributes read and write its row of the arrays instead of the instance
+        self.members.append(enemy)
+        enemy.crowd = self
+        enemy.crowd_slot = slot
+        enemy.__class__ = BatchedEnemy
+        for name in CROWD_ATTRIBUTES:
+            del enemy.__dict__[name]
+
+    def remove(self, enemy): # Hand an enemy its state back and fill its slot with the last member to keep the arrays packed
+        slot = enemy.crowd_slot
+        position = self.position[slot].copy()
+        velocity = self.velocity[slot].copy()
+        max_speed = self.max_speed[slot]
+        acceleration = self.acceleration[slot]
+        deceleration = self.deceleration[slot]
+
+        # Back to a plain Enemy, so the values below land on the instance again
+        enemy.__class__ = Enemy
+        enemy.crowd = None
+        enemy.crowd_slot = None
+        enemy.world_x, enemy.world_y = float(position[0]), float(position[1])
+        enemy.velocity_x, enemy.velocity_y = float(velocity[0]), float(velocity[1])
+        enemy.max_speed = float(max_speed)
+        enemy.acceleration = float(acceleration)
+        enemy.deceleration = float(deceleration)
+
+        last = len(self.members) - 1
+        if slot != last:
+            for name in CROWD_ARRAYS:
+                array = getattr(self, name)
+                array[slot] = array[last]
+            moved = self.members[last]
+            self.members[slot] = moved
+            moved.crowd_slot = slot
+        self.members.pop()
+
+    def step(self, clearance): # Advance the velocity of every member toward its chosen target in a few array operations
+        count = len(self.members)
+        if count == 0:
+            return
+
+        # Choosing a target needs each enemy's path and line of sight, so it stays per enemy
+        for slot, enemy in enumerate(self.members):
+            target = enemy.select_target()
+            if target is None:
+                self.has_target[slot] = False
+            else:
+                self.has_target[slot] = True
+                self.target[slot] = target
+
+        position = self.position[:count]
+        velocity = self.velocity[:count]
+        acceleration = self.acceleration[:count, None]
+
+        offset = self.target[:count] - position
+        distance = numpy.maximum(1, numpy.hypot(offset[:, 0], offset[:, 1]))
+        target_velocity = offset / distance[:, None] * self.max_speed[:count, None]
+
+        # Lean members brushing past a wall away from it, matching Enemy.movement
+        tiles = numpy.floor((position + TILESIZE // 2) / TILESIZE).astype(numpy.int64)
+        inside = ((tiles[:, 0] >= 0) & (tiles[:, 0] < clearance.width) &
+                  (tiles[:, 1] >= 0) & (tiles[:, 1] < clearance.height))
+        target_velocity[inside] += (clearance.push[tiles[inside, 1], tiles[inside, 0]] *
+                                    ENEMY_WALL_AVOIDANCE * self.max_speed[:count][inside, None])
+        speed = numpy.hypot(target_velocity[:, 0], target_velocity[:, 1])
+        too_fast = speed > self.max_speed[:count]
+        target_velocity[too_fast] *= (self.max_speed[:count][too_fast] / speed[too_fast])[:, None]
+        target_velocity[~self.has_target[:count]] = 0
+
+        difference = target_velocity - velocity
+        velocity[:] = numpy.where(numpy.abs(difference) > acceleration,
+                                  velocity + numpy.sign(difference) * acceleration, target_velocity)
+        velocity[numpy.abs(velocity) < self.deceleration[:count, None]] = 0
+
+    def separate(self, collision_margin, push_strength): # Push every overlapping pair of members apart at once
+        count = len(self.members)
+        if count < 2:
+            return
+
+        position = self.position[:count]
+        first, second = self.neighbor_pairs(position, collision_margin)
+
+        offset = position[first] - position[second]
+        distance = numpy.hypot(offset[:, 0], offset[:, 1])
+        overlapping = (distance > 0) & (distance < collision_margin)
+        if not overlapping.any():
+            return
+
+        first, second = first[overlapping], second[overlapping]
+        distance = distance[overlapping]
+        push = offset[overlapping] / distance[:, None] * ((collision_margin - distance) * push_strength)[:, None]
+        pushes = numpy.zeros((count, 2))
+        numpy.add.at(pushes, first, push)
+        numpy.subtract.at(pushes, second, push)
+
+        # Walls stop a push per enemy, the same way the unbatched separation does
+        for slot in numpy.flatnonzero(pushes.any(axis=1)):
+            self.members[slot].apply_push(pushes.item(slot, 0), pushes.item(slot, 1))
+
+    def neighbor_pairs(self, position, cell_size): # Index every pair of members in the same or touching cells once, like a spatial hash
+        cells = numpy.floor(position / cell_size).astype(numpy.int64) + CELL_KEY_OFFSET
+        keys = cells[:, 0] * CELL_KEY_STRIDE + cells[:, 1]
+        order = numpy.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        firsts = []
+        seconds = []
+        # Half of the surrounding cells are enough for every neighbouring pair to come up once
+        for offset_x, offset_y in [(0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]:
+            neighbor_keys = keys + offset_x * CELL_KEY_STRIDE + offset_y
+            start = numpy.searchsorted(sorted_keys, neighbor_keys, 'left')
+            counts = numpy.searchsorted(sorted_keys, neighbor_keys, 'right') - start
+
+            first = numpy.repeat(numpy.arange(len(keys)), counts)
+            within = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            second = order[numpy.repeat(start, counts) + within]
+
+            if offset_x == 0 and offset_y == 0:
+                keep = first < second
+                first, second = first[keep], second[keep]
+            firsts.append(first)
+            seconds.append(second)
+
+        return numpy.concatenate(firsts), numpy.concatenate(seconds)
@@ -0,0 +1,305 @@
+# Persistent walkability grid shared by pathfinding, spawning, line of sight and collision
+import itertools
+import numpy
+from collections import deque
+from config import *
+
+# Versions come from one counter so a new grid never reuses a version an old cache was keyed on
+grid_versions = itertools.count(1)
+
+# Number of tile changes remembered for incremental planners to replay
+MAX_TRACKED_CHANGES = 256
+
+
+class WalkGrid: # Initialize a compact occupancy map with one byte per tile (1 = wall, 0 = walkable)
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)
+        self.version = next(grid_versions)
+        self.first_version = self.version
+        self.changes = []
+
+    @classmethod
+    def from_tilemap(cls, tilemap): # Build the grid from tilemap rows, where 'B' marks a wall
+        width = max((len(row) for row in tilemap), default=0)
+        grid = cls(width, len(tilemap))
+        for y, row in enumerate(tilemap):
+            for x, column in enumerate(row):
+                if column == 'B':
+                    grid.cells[y * width + x] = 1
+        return grid
+
+    def in_bounds(self, x, y): # Check if a tile lies inside the grid
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_blocked(self, x, y): # Check if a tile inside the grid is a wall
+        return 0 <= x < self.width and 0 <= y < self.height and self.cells[y * self.width + x] == 1
+
+    def is_walkable(self, x, y): # Check if a tile inside the grid can be walked on
+        return 0 <= x < self.width and 0 <= y < self.height and self.cells[y * self.width + x] == 0
+
+    def solid_tiles_in_rect(self, rect): # List the wall tiles a pixel rect overlaps, in the same row-major order as the tilemap
+        tiles = []
+        for y in range(max(0, rect.top // TILESIZE), min(self.height, (rect.bottom - 1) // TILESIZE + 1)):
+            row = y * self.width
+            for x in range(max(0, rect.left // TILESIZE), min(self.width, (rect.right - 1) // TILESIZE + 1)):
+                if self.cells[row + x] == 1:
+                    tiles.append((x, y))
+        return tiles
+
+    def raycast(self, start_x, start_y, end_x, end_y): # Walk a pixel segment tile by tile and return the fraction of it travelled before entering a wall, or None if it stays clear
+        tile_x = int(start_x // TILESIZE)
+        tile_y = int(start_y // TILESIZE)
+        if not self.is_walkable(tile_x, tile_y):
+            return 0.0
+
+        end_tile_x = int(end_x // TILESIZE)
+        end_tile_y = int(end_y // TILESIZE)
+        dx = end_x - start_x
+        dy = end_y - start_y
+
+        # DDA: t_max is how far along the segment the next vertical or horizontal tile edge lies, t_delta the span of one tile
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        if dx != 0:
+            edge_x = (tile_x + (1 if dx > 0 else 0)) * TILESIZE
+            t_max_x = (edge_x - start_x) / dx
+            t_delta_x = TILESIZE / abs(dx)
+        else:
+            t_max_x = t_delta_x = float('inf')
+        if dy != 0:
+            edge_y = (tile_y + (1 if dy > 0 else 0)) * TILESIZE
+            t_max_y = (edge_y - start_y) / dy
+            t_delta_y = TILESIZE / abs(dy)
+        else:
+            t_max_y = t_delta_y = float('inf')
+
+        while (tile_x, tile_y) != (end_tile_x, end_tile_y):
+            if t_max_x < t_max_y:
+                t = t_max_x
+                tile_x += step_x
+                t_max_x += t_delta_x
+            else:
+                t = t_max_y
+                tile_y += step_y
+                t_max_y += t_delta_y
+
+            if t > 1:
+                break
+            if not self.is_walkable(tile_x, tile_y):
+                return t
+        return None
+
+    def set_blocked(self, x, y, blocked=True): # Change a tile's walkability and bump the version so caches invalidate
+        value = 1 if blocked else 0
+        index = y * self.width + x
+        if self.cells[index] != value:
+            self.cells[index] = value
+            self.version = next(grid_versions)
+            self.changes.append((self.version, (x, y)))
+            if len(self.changes) > MAX_TRACKED_CHANGES:
+                del self.changes[0]
+                self.first_version = self.changes[0][0] - 1
+
+    def changes_since(self, version): # List the tiles changed after version, or None if that version is not from this grid's tracked history
+        if version is None or version < self.first_version or version > self.version:
+            return None
+        return [cell for changed_version, cell in self.changes if changed_version > version]
+
+
+class VisibilityMap: # Initialize a per-tile map of what can be seen from one origin tile, recomputed only when the origin or grid changes
+    def __init__(self):
+        self.origin = None
+        self.version = None
+        self.width = 0
+        self.height = 0
+        self.visible = bytearray()
+        self.updates = 0
+
+    def update(self, origin, grid): # Recompute the map with symmetric shadowcasting if the origin tile or the grid has changed
+        if origin == self.origin and grid.version == self.version:
+            return False
+
+        self.origin = origin
+        self.version = grid.version
+        self.width = grid.width
+        self.height = grid.height
+        self.visible = bytearray(grid.width * grid.height)
+        self.updates += 1
+
+        origin_x, origin_y = origin
+        if not grid.in_bounds(origin_x, origin_y):
+            return True
+        self.visible[origin_y * grid.width + origin_x] = 1
+
+        # Each quadrant maps (depth, column) onto the grid, rows are scanned outward from the origin
+        for quadrant in range(4):
+            rows = [(1, (-1, 1), (1, 1))]
+            while rows:
+                depth, start_slope, end_slope = rows.pop()
+                min_col = (2 * depth * start_slope[0] + start_slope[1]) // (2 * start_slope[1])
+                max_col = -((end_slope[1] - 2 * depth * end_slope[0]) // (2 * end_slope[1]))
+
+                previous_wall = None
+                for col in range(min_col, max_col + 1):
+                    if quadrant == 0:
+                        x, y = origin_x + col, origin_y - depth
+                    elif quadrant == 1:
+                        x, y = origin_x + depth, origin_y + col
+                    elif quadrant == 2:
+                        x, y = origin_x + col, origin_y + depth
+                    else:
+                        x, y = origin_x - depth, origin_y + col
+
+                    # Tiles off the grid block sight so every scan ends at the map edge
+                    inside = 0 <= x < grid.width and 0 <= y < grid.height
+                    wall = not inside or grid.cells[y * grid.width + x] == 1
+
+                    symmetric = (col * start_slope[1] >= depth * start_slope[0] and
+                                 col * end_slope[1] <= depth * end_slope[0])
+                    if inside and (wall or symmetric):
+                        self.visible[y * grid.width + x] = 1
+
+                    if previous_wall and not wall:
+                        start_slope = (2 * col - 1, 2 * depth)
+                    if previous_wall is False and wall:
+                        rows.append((depth + 1, start_slope, (2 * col - 1, 2 * depth)))
+                    previous_wall = wall
+
+                if previous_wall is False:
+                    rows.append((depth + 1, start_slope, end_slope))
+        return True
+
+    def is_visible(self, x, y): # Check if a tile can be seen from the origin
+        return 0 <= x < self.width and 0 <= y < self.height and self.visible[y * self.width + x] == 1
+
+
+class FreeCellIndex: # Initialize an index of the tiles enemies may spawn on, with every tile's nearest spawn tile precomputed
+    def __init__(self):
+        self.version = None
+        self.width = 0
+        self.height = 0
+        self.cells = numpy.zeros((0, 2), dtype=numpy.int32)
+        self.nearest = numpy.zeros(0, dtype=numpy.int32)
+
+    def update(self, grid): # Rebuild the index if the grid has changed since it was last built
+        if grid.version == self.version:
+            return False
+
+        self.version = grid.version
+        self.width = grid.width
+        self.height = grid.height
+
+        # Spawn tiles are the walkable tiles inside a disc that keeps enemies away from the outer walls
+        center_x = grid.width // 2
+        center_y = grid.height // 2
+        radius = min(grid.width, grid.height) // 2 - 3
+        walls = numpy.frombuffer(bytes(grid.cells), dtype=numpy.uint8).reshape(grid.height, grid.width)
+        ys, xs = numpy.mgrid[0:grid.height, 0:grid.width]
+        free = (walls == 0) & ((xs - center_x) ** 2 + (ys - center_y) ** 2 < radius * radius)
+        self.cells = numpy.argwhere(free)[:, ::-1].astype(numpy.int32)
+
+        # Breadth-first search outward from every spawn tile at once, so each tile learns its closest one. The search
+        # spreads through walls too, so an enemy shoved into a wall still finds the spawn tile next to it
+        self.nearest = numpy.full(grid.width * grid.height, -1, dtype=numpy.int32)
+        frontier = deque()
+        for x, y in self.cells.tolist():
+            index = y * grid.width + x
+            self.nearest[index] = index
+            frontier.append((x, y))
+
+        while frontier:
+            x, y = frontier.popleft()
+            source = self.nearest[y * grid.width + x]
+            for next_x, next_y in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+                if grid.in_bounds(next_x, next_y) and self.nearest[next_y * grid.width + next_x] == -1:
+                    self.nearest[next_y * grid.width + next_x] = source
+                    frontier.append((next_x, next_y))
+        return True
+
+    def sample(self, count, rng, exclude_x, exclude_y, exclude_range=3): # Draw up to count distinct spawn tiles, skipping the square around the excluded tile
+        allowed = ~((numpy.abs(self.cells[:, 0] - exclude_x) < exclude_range) &
+                    (numpy.abs(self.cells[:, 1] - exclude_y) < exclude_range))
+        candidates = self.cells[allowed]
+        picks = rng.choice(len(candidates), size=min(count, len(candidates)), replace=False)
+        return [tuple(cell) for cell in candidates[picks].tolist()]
+
+    def nearest_cell(self, x, y): # Look up the spawn tile fewest steps from a tile, or None if the tile is off the grid or there are none
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        index = int(self.nearest[y * self.width + x])
+        if index < 0:
+            return None
+        return (index % self.width, index // self.width)
+
+    def is_spawn_cell(self, x, y): # Check if a tile is one of the spawn tiles
+        return self.nearest_cell(x, y) == (x, y)
+
+
+class ClearanceMap: # Initialize a per-tile map of how many tiles separate each tile from the nearest wall
+    def __init__(self):
+        self.version = None
+        self.width = 0
+        self.height = 0
+        self.distances = numpy.zeros((0, 0), dtype=numpy.int32)
+        self.push = numpy.zeros((0, 0, 2))
+        self.values = []
+        self.pushes = []
+
+    def update(self, grid): # Recompute the distance transform if the grid has changed since it was last built
+        if grid.version == self.version:
+            return False
+
+        self.version = grid.version
+        self.width = grid.width
+        self.height = grid.height
+
+        # The padded border stays 0 so the map edge counts as a wall
+        walls = numpy.frombuffer(bytes(grid.cells), dtype=numpy.uint8).reshape(grid.height, grid.width)
+        padded = numpy.zeros((grid.height + 2, grid.width + 2), dtype=numpy.int32)
+        inner = padded[1:-1, 1:-1]
+        inner[:] = numpy.where(walls == 1, 0, grid.width + grid.height)
+
+        # Two-pass chamfer transform giving chessboard distances: a forward pass takes each row from the row above, a
+        # backward pass from the row below. Within a row a running minimum of value - column carries the distance from
+        # the left in one call, and the mirrored minimum from the right
+        columns = numpy.arange(grid.width + 2)
+        for y in range(1, grid.height + 1):
+            self.sweep_row(padded, y, y - 1, columns)
+        for y in range(grid.height, 0, -1):
+            self.sweep_row(padded, y, y + 1, columns)
+        self.distances = inner.copy()
+
+        # Walkable tiles touching a wall get a unit vector pointing up the clearance slope, away from the wall
+        push_x = (padded[1:-1, 2:] - padded[1:-1, :-2]).astype(float)
+        push_y = (padded[2:, 1:-1] - padded[:-2, 1:-1]).astype(float)
+        length = numpy.hypot(push_x, push_y)
+        brushing = (self.distances == 1) & (length > 0)
+        self.push = numpy.zeros((grid.height, grid.width, 2))
+        self.push[brushing, 0] = push_x[brushing] / length[brushing]
+        self.push[brushing, 1] = push_y[brushing] / length[brushing]
+
+        # Plain lists answer single-tile lookups faster than indexing the arrays one element at a time
+        self.values = self.distances.ravel().tolist()
+        self.pushes = [tuple(push) for push in self.push.reshape(-1, 2).tolist()]
+        return True
+
+    def sweep_row(self, padded, y, source_y, columns): # Lower a padded row's distances from the three tiles above or below each tile and from its own row
+        row = padded[y]
+        source = padded[source_y] + 1
+        numpy.minimum(row[1:-1], source[:-2], out=row[1:-1])
+        numpy.minimum(row[1:-1], source[1:-1], out=row[1:-1])
+        numpy.minimum(row[1:-1], source[2:], out=row[1:-1])
+        numpy.minimum(row, numpy.minimum.accumulate(row - columns) + columns, out=row)
+        numpy.minimum(row, numpy.minimum.accumulate((row + columns)[::-1])[::-1] - columns, out=row)
+
+    def clearance(self, x, y): # Look up a tile's distance to the nearest wall, treating tiles off the map as walls
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        return self.values[y * self.width + x]
+
+    def wall_push(self, x, y): # Look up the direction that leads a tile's occupant away from an adjacent wall, or (0, 0) in open space
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return (0.0, 0.0)
+        return self.pushes[y * self.width + x]
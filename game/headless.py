@@ -0,0 +1,142 @@
+# Headless engine: runs the game's own waves with no window or mixer, on a clock that never waits, as fast as the CPU allows
+import argparse
+import cProfile
+import math
+import pstats
+import time
+import pygame
+from config import *
+from controls import ScriptedControls
+from main import Game, GameState
+from recording import InputRecorder, InputPlayback, load_recording, run_summary
+
+
+class FixedClock: # Initialize a clock that reports the same frame time on every tick and never sleeps
+    def __init__(self, frame_ms=1000 / SIM_RATE):
+        self.frame_ms = frame_ms
+
+    def tick(self, framerate=0): # Return the fixed frame time straight away, whatever frame rate is asked for
+        return self.frame_ms
+
+
+def auto_pilot(game): # Script that shoots at the nearest enemy and backs away from any that get within two tiles
+    player = game.player
+    nearest = None
+    nearest_distance = math.inf
+    for enemy in game.enemies:
+        distance = math.hypot(enemy.world_x - player.world_x, enemy.world_y - player.world_y)
+        if distance < nearest_distance:
+            nearest, nearest_distance = enemy, distance
+    if nearest is None:
+        return (), None, False
+
+    keys = []
+    if nearest_distance < TILESIZE * 2:
+        keys.append(pygame.K_d if nearest.world_x < player.world_x else pygame.K_a)
+        keys.append(pygame.K_s if nearest.world_y < player.world_y else pygame.K_w)
+    return keys, (nearest.world_x + TILESIZE // 2, nearest.world_y + TILESIZE // 2), True
+
+
+def run_headless(player_class='mage', level=1, wave=1, levels=1, script=auto_pilot, max_seconds=1800, stall_seconds=120,
+                 seed=None, recorder=None): # Play levels from a starting wave and report how the run went
+    game_state = GameState()
+    game_state.current_level = level
+    game_state.current_wave = wave
+    game = Game(game_state, headless=True, clock=FixedClock(), controls=ScriptedControls(script),
+                seed=seed, recorder=recorder)
+    game.player_class = player_class
+    game.new()
+
+    start = time.perf_counter()
+    last_level = min(level + levels - 1, max(game_state.max_waves_per_level))
+
+    # A run stalls when no enemy dies and no wave starts for stall_seconds, e.g. an enemy the script cannot reach
+    progress = None
+    progress_time = 0
+    stalled = False
+    while game.playing and game_state.current_level <= last_level and game.ticks() < max_seconds * 1000:
+        game.frame()
+        state = (game_state.current_level, game_state.current_wave, len(game.enemies))
+        if state != progress:
+            progress, progress_time = state, game.ticks()
+        elif game.ticks() - progress_time > stall_seconds * 1000:
+            stalled = True
+            break
+    wall_seconds = time.perf_counter() - start
+
+    if recorder is not None:
+        recorder.save(game)
+
+    return {
+        'player_class': player_class,
+        'seed': game.seed,
+        'level': game_state.current_level,
+        'wave': game_state.current_wave,
+        'victory': game.victory or game_state.current_level > last_level,
+        'died': game.player.health <= 0,
+        'stalled': stalled,
+        'health': game.player.health,
+        'gold': game.gold,
+        'ticks': game.sim_tick,
+        'sim_seconds': game.ticks() / 1000,
+        'wall_seconds': wall_seconds,
+        'speedup': game.ticks() / 1000 / max(wall_seconds, 1e-9)
+    }
+
+
+def run_replay(recording, profile=None): # Play a recording back as fast as possible and check it ends where the original run did
+    if recording['sim_rate'] != SIM_RATE:
+        raise ValueError(f"Recording ran at {recording['sim_rate']} ticks per second, the game now runs at {SIM_RATE}")
+
+    game_state = GameState()
+    for field, value in recording['game_state'].items():
+        setattr(game_state, field, value)
+    playback = InputPlayback(recording)
+    game = Game(game_state, headless=True, clock=FixedClock(), controls=ScriptedControls(playback), seed=recording['seed'])
+    game.player_class = recording['player_class']
+    game.new()
+
+    start = time.perf_counter()
+    if profile is not None:
+        profile.enable()
+    while game.playing and not playback.finished():
+        game.frame()
+    if profile is not None:
+        profile.disable()
+    wall_seconds = time.perf_counter() - start
+
+    replayed = run_summary(game)
+    return {
+        'matches': replayed == recording['result'],
+        'recorded': recording['result'],
+        'replayed': replayed,
+        'wall_seconds': wall_seconds,
+        'speedup': game.ticks() / 1000 / max(wall_seconds, 1e-9)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate Escape from Hel without a window")
+    parser.add_argument('--class', dest='player_class', default='mage', choices=['warrior', 'mage', 'rogue'])
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--wave', type=int, default=1)
+    parser.add_argument('--levels', type=int, default=1)
+    parser.add_argument('--max-seconds', type=float, default=1800, help="simulated seconds before giving up")
+    parser.add_argument('--stall-seconds', type=float, default=120, help="simulated seconds without a kill before giving up")
+    parser.add_argument('--seed', type=int, help="session seed, random if not given")
+    parser.add_argument('--record', action='store_true', help=f"save the run's input to {RECORDINGS_DIR}/")
+    parser.add_argument('--replay', metavar='FILE', help="replay a recording instead of running the script")
+    parser.add_argument('--profile', action='store_true', help="profile the replay and print the costliest calls")
+    args = parser.parse_args()
+
+    if args.replay:
+        profile = cProfile.Profile() if args.profile else None
+        result = run_replay(load_recording(args.replay), profile)
+        if profile is not None:
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+    else:
+        result = run_headless(args.player_class, args.level, args.wave, args.levels,
+                              max_seconds=args.max_seconds, stall_seconds=args.stall_seconds,
+                              seed=args.seed, recorder=InputRecorder() if args.record else None)
+    for key, value in result.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -28,64 +28,64 @@ def initialize_items(game): # Create all weapons and armors available in the gam
     # Define all weapons for each character class with different damage values and level requirements
     weapons = {
         "warrior": [
-            Weapon("Iron Shortsword", game.item_spritesheet.get_sprite(0, 32, TILESIZE, TILESIZE), "warrior", 15),
-            Weapon("Steel Axe", game.item_spritesheet.get_sprite(0, 96, TILESIZE, TILESIZE), "warrior", 20),
-            Weapon("War Hammer", game.item_spritesheet.get_sprite(0, 128, TILESIZE, TILESIZE), "warrior", 25),
-            Weapon("Halberd", game.item_spritesheet.get_sprite(64, 128, TILESIZE, TILESIZE), "warrior", 25),
-            Weapon("Great Sword", game.item_spritesheet.get_sprite(128, 0, TILESIZE, TILESIZE), "warrior", 35),
-            Weapon("Battle Axe", game.item_spritesheet.get_sprite(32, 96, TILESIZE, TILESIZE), "warrior", 40),
-            Weapon("Club", game.item_spritesheet.get_sprite(64, 256, TILESIZE, TILESIZE), "warrior", 45),
-            Weapon("Trident", game.item_spritesheet.get_sprite(96, 192, TILESIZE, TILESIZE), "warrior", 40),
-            Weapon("Dragon Slayer", game.item_spritesheet.get_sprite(192, 32, TILESIZE, TILESIZE), "warrior", 70),
-            Weapon("Blade of the Ruined King", game.item_spritesheet.get_sprite(256, 0, TILESIZE, TILESIZE), "warrior", 65)
+            Weapon("Iron Shortsword", game.atlas.sprite('items', 'wide short sword'), "warrior", 15),
+            Weapon("Steel Axe", game.atlas.sprite('items', 'hand axe'), "warrior", 20),
+            Weapon("War Hammer", game.atlas.sprite('items', 'blacksmiths hammer'), "warrior", 25),
+            Weapon("Halberd", game.atlas.sprite('items', 'long warhammer'), "warrior", 25),
+            Weapon("Great Sword", game.atlas.sprite('items', 'bastard sword'), "warrior", 35),
+            Weapon("Battle Axe", game.atlas.sprite('items', 'battle axe'), "warrior", 40),
+            Weapon("Club", game.atlas.sprite('items', 'great club'), "warrior", 45),
+            Weapon("Trident", game.atlas.sprite('items', 'trident'), "warrior", 40),
+            Weapon("Dragon Slayer", game.atlas.sprite('items', 'great sword'), "warrior", 70),
+            Weapon("Blade of the Ruined King", game.atlas.sprite('items', 'crystal sword'), "warrior", 65)
         ],
         "mage": [
-            Weapon("Apprentice Staff", game.item_spritesheet.get_sprite(0, 320, TILESIZE, TILESIZE), "mage", 5),
-            Weapon("Sun Wand", game.item_spritesheet.get_sprite(32, 320, TILESIZE, TILESIZE), "mage", 5),
-            Weapon("Thorn Staff", game.item_spritesheet.get_sprite(64, 320, TILESIZE, TILESIZE), "mage", 7),
-            Weapon("Water Wand", game.item_spritesheet.get_sprite(96, 320, TILESIZE, TILESIZE), "mage", 7),
-            Weapon("Lightning Staff", game.item_spritesheet.get_sprite(128, 320, TILESIZE, TILESIZE), "mage", 10),
-            Weapon("Blood Staff", game.item_spritesheet.get_sprite(160, 320, TILESIZE, TILESIZE), "mage", 10),
-            Weapon("Soul Flame Staff", game.item_spritesheet.get_sprite(192, 320, TILESIZE, TILESIZE), "mage", 15),
-            Weapon("Azure Stone Staff", game.item_spritesheet.get_sprite(224, 320, TILESIZE, TILESIZE), "mage", 15),
-            Weapon("Staff of the Elite", game.item_spritesheet.get_sprite(256, 320, TILESIZE, TILESIZE), "mage", 20),
-            Weapon("Shillelagh of the Old One", game.item_spritesheet.get_sprite(288, 320, TILESIZE, TILESIZE), "mage", 20)
+            Weapon("Apprentice Staff", game.atlas.sprite('items', 'crystal staff'), "mage", 5),
+            Weapon("Sun Wand", game.atlas.sprite('items', 'holy staff'), "mage", 5),
+            Weapon("Thorn Staff", game.atlas.sprite('items', 'druid staff'), "mage", 7),
+            Weapon("Water Wand", game.atlas.sprite('items', 'blue staff'), "mage", 7),
+            Weapon("Lightning Staff", game.atlas.sprite('items', 'golden staff'), "mage", 10),
+            Weapon("Blood Staff", game.atlas.sprite('items', 'red crystal staff'), "mage", 10),
+            Weapon("Soul Flame Staff", game.atlas.sprite('items', 'flame staff'), "mage", 15),
+            Weapon("Azure Stone Staff", game.atlas.sprite('items', 'blue crystal staff'), "mage", 15),
+            Weapon("Staff of the Elite", game.atlas.sprite('items', 'cross staff'), "mage", 20),
+            Weapon("Shillelagh of the Old One", game.atlas.sprite('items', "saint's staff"), "mage", 20)
         ],
         "rogue": [
-            Weapon("Rusty Dagger", game.item_spritesheet.get_sprite(0, 0, TILESIZE, TILESIZE), "rogue", 20),
-            Weapon("Large Dagger", game.item_spritesheet.get_sprite(32, 0, TILESIZE, TILESIZE), "rogue", 20),
-            Weapon("Sickle", game.item_spritesheet.get_sprite(0, 64, TILESIZE, TILESIZE), "rogue", 30),
-            Weapon("Kukri", game.item_spritesheet.get_sprite(128, 64, TILESIZE, TILESIZE), "rogue", 30),
-            Weapon("Small Cutlass", game.item_spritesheet.get_sprite(32, 64, TILESIZE, TILESIZE), "rogue", 35),
-            Weapon("Molten Dagger", game.item_spritesheet.get_sprite(192, 0, TILESIZE, TILESIZE), "rogue", 35),
-            Weapon("Shadow Dagger", game.alt_item_spritesheet.get_sprite(0, 256, TILESIZE, TILESIZE), "rogue", 45),
-            Weapon("Mythril Dagger", game.alt_item_spritesheet.get_sprite(0, 512, TILESIZE, TILESIZE), "rogue", 45),
-            Weapon("Dagger of Ullr", game.item_spritesheet.get_sprite(224, 0, TILESIZE, TILESIZE), "rogue", 60),
-            Weapon("Soulflame Blade", game.item_spritesheet.get_sprite(320, 0, TILESIZE, TILESIZE), "rogue", 60)
+            Weapon("Rusty Dagger", game.atlas.sprite('items', 'dagger'), "rogue", 20),
+            Weapon("Large Dagger", game.atlas.sprite('items', 'short sword'), "rogue", 20),
+            Weapon("Sickle", game.atlas.sprite('items', 'shotel'), "rogue", 30),
+            Weapon("Kukri", game.atlas.sprite('items', 'kukri'), "rogue", 30),
+            Weapon("Small Cutlass", game.atlas.sprite('items', 'scimitar'), "rogue", 35),
+            Weapon("Molten Dagger", game.atlas.sprite('items', 'sanguine dagger'), "rogue", 35),
+            Weapon("Shadow Dagger", game.atlas.region('items-palette-swaps', 0, 256), "rogue", 45),
+            Weapon("Mythril Dagger", game.atlas.region('items-palette-swaps', 0, 512), "rogue", 45),
+            Weapon("Dagger of Ullr", game.atlas.sprite('items', 'magic dagger'), "rogue", 60),
+            Weapon("Soulflame Blade", game.atlas.sprite('items', 'flame sword'), "rogue", 60)
         ]
     }
     # Define all armors for each character class with different health bonuses and level requirements
     armors = {
         "warrior": [
-            Armor("Leather Plate", game.item_spritesheet.get_sprite(0, 384, TILESIZE, TILESIZE), "warrior", 10),
-            Armor("Iron Chainmail", game.item_spritesheet.get_sprite(128, 384, TILESIZE, TILESIZE), "warrior", 15),
-            Armor("Knight's Helm", game.item_spritesheet.get_sprite(160, 480, TILESIZE, TILESIZE), "warrior", 20),
-            Armor("Knight's Gauntlets", game.item_spritesheet.get_sprite(96, 512, TILESIZE, TILESIZE), "warrior", 25),
-            Armor("Warlord's Plate", game.item_spritesheet.get_sprite(160, 384, TILESIZE, TILESIZE), "warrior", 30)
+            Armor("Leather Plate", game.atlas.sprite('items', 'cloth armor'), "warrior", 10),
+            Armor("Iron Chainmail", game.atlas.sprite('items', 'scale mail'), "warrior", 15),
+            Armor("Knight's Helm", game.atlas.sprite('items', 'helm with chain mail'), "warrior", 20),
+            Armor("Knight's Gauntlets", game.atlas.sprite('items', 'disc pendant'), "warrior", 25),
+            Armor("Warlord's Plate", game.atlas.sprite('items', 'chest plate'), "warrior", 30)
         ],
         "mage": [
-            Armor("Cloth Robe", game.item_spritesheet.get_sprite(0, 384, TILESIZE, TILESIZE), "mage", 5),
-            Armor("Enchanted Cloak", game.item_spritesheet.get_sprite(64, 384, TILESIZE, TILESIZE), "mage", 8),
-            Armor("Hat of Wizardry", game.item_spritesheet.get_sprite(64, 480, TILESIZE, TILESIZE), "mage", 11),
-            Armor("Pendant of Sorcery", game.item_spritesheet.get_sprite(64, 512, TILESIZE, TILESIZE), "mage", 14),
-            Armor("Ring of Hel", game.item_spritesheet.get_sprite(96, 544, TILESIZE, TILESIZE), "mage", 17),
+            Armor("Cloth Robe", game.atlas.sprite('items', 'cloth armor'), "mage", 5),
+            Armor("Enchanted Cloak", game.atlas.sprite('items', 'robe'), "mage", 8),
+            Armor("Hat of Wizardry", game.atlas.sprite('items', 'wide-brimmed hat'), "mage", 11),
+            Armor("Pendant of Sorcery", game.atlas.sprite('items', 'crystal pendant'), "mage", 14),
+            Armor("Ring of Hel", game.atlas.sprite('items', 'ruby ring'), "mage", 17),
         ],
         "rogue": [
-            Armor("Leather Vest", game.item_spritesheet.get_sprite(0, 384, TILESIZE, TILESIZE), "rogue", 7),
-            Armor("Shadow Garb", game.item_spritesheet.get_sprite(96, 160, TILESIZE, TILESIZE), "rogue", 12),
-            Armor("Assassins Hood", game.item_spritesheet.get_sprite(0, 480, TILESIZE, TILESIZE), "rogue", 17),
-            Armor("Pendant of Trickery", game.item_spritesheet.get_sprite(32, 512, TILESIZE, TILESIZE), "rogue", 22),
-            Armor("Ring of Loki", game.item_spritesheet.get_sprite(0, 544, TILESIZE, TILESIZE), "rogue", 27),
+            Armor("Leather Vest", game.atlas.sprite('items', 'cloth armor'), "rogue", 7),
+            Armor("Shadow Garb", game.atlas.sprite('items', 'spiked bat'), "rogue", 12),
+            Armor("Assassins Hood", game.atlas.sprite('items', 'cloth hood'), "rogue", 17),
+            Armor("Pendant of Trickery", game.atlas.sprite('items', 'metal pendant'), "rogue", 22),
+            Armor("Ring of Loki", game.atlas.sprite('items', 'gold emerald ring'), "rogue", 27),
         ]
     }
 
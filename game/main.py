@@ -1,80 +1,110 @@
-import pygame, sys, random, os, json
+import pygame, sys, random, os, json, time, numpy
 from config import *
 from sprites import *
 from items import initialize_items
+from pathfinding import FlowField, PathCache, PathRequestQueue, INFINITY
+from grid import WalkGrid, VisibilityMap, FreeCellIndex, ClearanceMap
+from spatial import SpatialHash
+from crowd import Crowd
+from camera import Camera
+from assets import shared_assets
+from audio_manager import AudioManager
+from controls import KeyboardControls
+from recording import InputRecorder
 
 
 class Game:
-    def __init__(self, game_state=None): # Initialize the game, set up display, load assets, and prepare game state
-        pygame.init()
+    def __init__(self, game_state=None, headless=False, clock=None, controls=None, seed=None, recorder=None): # Initialize the game, set up display, load assets, and prepare game state
+        init_start = time.perf_counter()
+        self.headless = headless
+
+        # Every random choice in the session comes from this seed, so a seeded run can be played again exactly
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.recorder = recorder if recorder is not None or not RECORD_INPUT or headless else InputRecorder()
+        self.deterministic = seed is not None or self.recorder is not None
+        if headless:
+            # No window and no mixer; the dummy video driver still gives images a pixel format to convert to
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            pygame.display.init()
+            pygame.font.init()
+        else:
+            pygame.init()
         self.screen = pygame.display.set_mode((WW, WH))
-        self.clock = pygame.time.Clock()
+        self.clock = clock if clock is not None else pygame.time.Clock()
+        self.controls = controls if controls is not None else KeyboardControls()
         self.running = True
+        self.victory = False
         pygame.display.set_caption("Escape from Hel")
         if game_state is None:
             self.game_state = GameState()
         else:
             self.game_state = game_state
-        self.character_spritesheet = Spritesheet('img/32rogues/rogues.png')
-        self.terrain_spritesheet = Spritesheet('img/32rogues/tiles.png')
-        self.enemy_spritesheet = Spritesheet('img/32rogues/monsters.png')
-        self.item_spritesheet = Spritesheet('img/32rogues/items.png')
-        self.alt_item_spritesheet = Spritesheet('img/32rogues/items-palette-swaps.png')
-        self.fireball = Spritesheet('img/shot_fireball.png')
-        self.dagger = Spritesheet('img/rogue_skill4_frame4.png')
-        self.sword_swing = Spritesheet('img/rogue_skill2_frame2.png')
+        # Images, rotations and fonts are built once per process and reused by every Game after a restart
+        self.assets = shared_assets()
+        self.atlas = self.assets.atlas
 
         self.block_textures = {
-            1: self.terrain_spritesheet.get_sprite(0, 32, TILESIZE, TILESIZE),
-            2: self.terrain_spritesheet.get_sprite(0, 0, TILESIZE, TILESIZE),
-            3: self.terrain_spritesheet.get_sprite(0, 128, TILESIZE, TILESIZE),
-            4: self.terrain_spritesheet.get_sprite(96, 608, TILESIZE, TILESIZE),
-            5: self.terrain_spritesheet.get_sprite(0, 96, TILESIZE, TILESIZE)
+            1: self.atlas.sprite('tiles', 'rough stone wall (top)'),
+            2: self.atlas.sprite('tiles', 'dirt wall (top)'),
+            3: self.atlas.sprite('tiles', 'large stone wall (top)'),
+            4: self.atlas.sprite('tiles', 'kenaf'),
+            5: self.atlas.sprite('tiles', 'igneous wall (top)')
         }
 
         self.enemy_textures = {
-            1: self.enemy_spritesheet.get_sprite(64, 0, TILESIZE, TILESIZE),
-            2: self.enemy_spritesheet.get_sprite(0, 32, TILESIZE, TILESIZE),
-            3: self.enemy_spritesheet.get_sprite(224, 192, TILESIZE, TILESIZE),
-            4: self.enemy_spritesheet.get_sprite(0, 320, TILESIZE, TILESIZE),
-            5: self.enemy_spritesheet.get_sprite(96, 128, TILESIZE, TILESIZE)
+            1: self.atlas.sprite('monsters', 'goblin'),
+            2: self.atlas.sprite('monsters', 'ettin'),
+            3: self.atlas.sprite('monsters', 'lesser giant ant'),
+            4: self.atlas.sprite('monsters', 'small myconid'),
+            5: self.atlas.sprite('monsters', 'death knight')
         }
 
         self.ground_textures = {
-            1: self.terrain_spritesheet.get_sprite(0, 192, TILESIZE, TILESIZE),
-            2: self.terrain_spritesheet.get_sprite(0, 480, TILESIZE, TILESIZE),
-            3: self.terrain_spritesheet.get_sprite(0, 352, TILESIZE, TILESIZE),
-            4: self.terrain_spritesheet.get_sprite(0, 416, TILESIZE, TILESIZE),
-            5: self.terrain_spritesheet.get_sprite(500, 320, TILESIZE, TILESIZE)
+            1: self.atlas.sprite('tiles', 'blank floor (dark grey)'),
+            2: self.atlas.sprite('tiles', 'dark brown bg'),
+            3: self.atlas.sprite('tiles', 'blank red floor'),
+            4: self.atlas.sprite('tiles', 'blank green floor'),
+            5: self.atlas.region('tiles', 500, 320)
         }
 
         self.boss_textures = {
-            1: self.enemy_spritesheet.get_sprite(128, 0, TILESIZE, TILESIZE),
-            2: self.enemy_spritesheet.get_sprite(64, 32, TILESIZE, TILESIZE),
-            3: self.enemy_spritesheet.get_sprite(128, 192, TILESIZE, TILESIZE),
-            4: self.enemy_spritesheet.get_sprite(32, 320, TILESIZE, TILESIZE),
-            5: self.enemy_spritesheet.get_sprite(0, 352, TILESIZE, TILESIZE)
-        }
-
-        self.weapon_textures = {
-            'mage': self.fireball,
-            'warrior': self.item_spritesheet.get_sprite(32, 96, 32, 32),
-            'rogue': self.item_spritesheet.get_sprite(32, 0, 32, 32)
+            1: self.atlas.sprite('monsters', 'orc warchief'),
+            2: self.atlas.sprite('monsters', 'troll'),
+            3: self.atlas.sprite('monsters', 'giant ant'),
+            4: self.atlas.sprite('monsters', 'large myconid'),
+            5: self.atlas.sprite('monsters', 'angel / archangel')
         }
 
-        self.warrior_attack_sprite = pygame.image.load("img/rogue_skill2_frame2.png").convert_alpha()
-        self.rogue_attack_sprite = pygame.image.load("img/rogue_skill4_frame4.png").convert_alpha()
-        self.mage_attack_sprite = pygame.image.load("img/shot_fireball.png").convert_alpha()
+        # Attack rotations live in the shared registry, so each angle bucket is rendered once per process rather than per attack
+        self.attack_rotations = self.assets.attack_rotations
 
 
         self.title_screen = TitleScreen(self)
         self.game_over_screen = GameOverScreen(self)
-        pygame.mixer.init()
+        self.audio = AudioManager(enabled=False) if headless else self.assets.shared_audio()
+        self.audio.prefetch(self.game_state.current_level)
+        self.text = self.assets.text
         self.ui = UI(self)
         self.gold = 0
         self.wave = 1
         self.weapons, self.armors = initialize_items(self)
 
+        # Anything built from source files this launch is written back so the next launch can skip it
+        self.assets.cache.save()
+        self.startup_timings = {
+            'init_ms': (time.perf_counter() - init_start) * 1000,
+            'assets_ms': self.assets.timings['registry_ms'],
+            'cache_hits': self.assets.cache.hits,
+            'cache_misses': self.assets.cache.misses
+        }
+        if SHOW_STARTUP_TIMINGS:
+            print("Startup: {init_ms:.1f} ms ({assets_ms:.1f} ms building shared assets), "
+                  "asset cache {cache_hits} hits / {cache_misses} misses".format(**self.startup_timings))
+
+        self.sim_tick = 0
+        self.sim_lag = 0
+
         self.wave_complete_timer = 0
         self.wave_complete_delay = 0
         self.wave_transition_pending = False
@@ -84,28 +114,53 @@ class Game:
         self.direct_notification_time = 0
         self.direct_notification_duration = 0
 
-    def createTilemap(self, tilemap=None): # Create the game map from a tilemap array, placing ground, blocks and player
+        self.pathfinding_mode = ENEMY_PATHFINDING
+        self.flow_field = FlowField()
+        self.path_cache = PathCache()
+        self.path_requests = PathRequestQueue(PATHFINDING_BUDGET_MS,
+                                              PATHFINDING_REQUESTS_PER_TICK if self.deterministic else None)
+        self.enemy_hash = SpatialHash(TILESIZE)
+        self.hit_hash = SpatialHash(TILESIZE * 2)
+        self.hit_hash_tick = -1
+        self.crowd = None
+        self.line_of_sight_mode = ENEMY_LINE_OF_SIGHT
+        self.visibility = VisibilityMap()
+        self.spawn_cells = FreeCellIndex()
+        self.camera = Camera(WW, WH)
+        self.clearance = ClearanceMap()
+        self.spawn_rng = numpy.random.default_rng(self.seed)
+
+    def createTilemap(self, tilemap=None): # Create the game map from a tilemap array, baking the terrain and placing the player
         if tilemap is None:
             tilemap = level1_map
+        self.grid = WalkGrid.from_tilemap(tilemap)
+        self.spawn_cells.update(self.grid)
+        self.clearance.update(self.grid)
+
+        # Floor and walls never move, so they are painted once instead of living in the sprite groups
+        self.terrain = TerrainLayer(self.grid,
+                                    self.ground_textures.get(self.current_level, self.ground_textures[1]),
+                                    self.block_textures.get(self.current_level, self.block_textures[1]))
         for i, row in enumerate(tilemap):
             for j, column in enumerate(row):
-                Ground(self, j, i, self.ground_textures.get(self.current_level, self.ground_textures[1]))
-                if column == 'B':
-                    Block(self, j, i, self.block_textures.get(self.current_level, self.block_textures[1]))
                 if column == 'P':
                     self.player = Player(self, j, i, self.player_class)
 
+        self.flow_field = FlowField()
+        self.path_cache.clear()
+        self.path_requests.clear()
+        self.crowd = Crowd() if ENEMY_CROWD_BATCHING else None
+
     def set_direct_notification(self, text, duration=5000): # Set up an on-screen notification with specified text and duration
         self.direct_notification = text
-        self.direct_notification_time = pygame.time.get_ticks()
+        self.direct_notification_time = self.ticks()
         self.direct_notification_duration = duration
 
     def draw_direct_notification(self, surface): # Draw active notification messages on the screen if they haven't expired
         if self.direct_notification:
-            current_time = pygame.time.get_ticks()
+            current_time = self.ticks()
             if current_time - self.direct_notification_time < self.direct_notification_duration:
-                font = pygame.font.Font(None, 36)
-                text_surf = font.render(self.direct_notification, True, (255, 255, 0))
+                text_surf = self.text.render(self.direct_notification, 36, (255, 255, 0))
                 text_rect = text_surf.get_rect(center=(surface.get_width() // 2, 100))
 
                 surface.blit(text_surf, text_rect)
@@ -118,10 +173,15 @@ class Game:
                 sprite.kill()
         self.playing = True
         self.all_sprites = pygame.sprite.LayeredUpdates()
-        self.blocks = pygame.sprite.LayeredUpdates()
         self.enemies = pygame.sprite.LayeredUpdates()
         self.attacks = pygame.sprite.LayeredUpdates()
 
+        # Each new run starts the session's random streams over, so a recording replays from its first tick
+        self.rng.seed(self.seed)
+        self.spawn_rng = numpy.random.default_rng(self.seed)
+        if self.recorder is not None:
+            self.recorder.start(self)
+
         self.player = Player(self, WW // 2, WH // 2, self.player_class)
 
         self.load_level(self.game_state.current_level)
@@ -148,24 +208,16 @@ class Game:
             enemy_texture = self.enemy_textures.get(level, self.enemy_textures[1])
             num_enemies = 4 + wave
             enemy_level = wave * level + int(player_level / 2)
-            for _ in range(num_enemies):
-                valid_pos = self.find_valid_position()
-                if valid_pos:
-                    Enemy(self, valid_pos[0], valid_pos[1], enemy_texture, level=enemy_level)
+            for x, y in self.find_valid_positions(num_enemies):
+                Enemy(self, x, y, enemy_texture, level=enemy_level)
 
         self.game_state.current_wave = wave
         self.ui.wave = wave
 
     def is_valid_position(self, x, y): # Check if a position is valid for enemy spawning (not in walls or too close to player)
-        if x < 0 or x >= 40 or y < 0 or y >= 30:
+        if not self.grid.is_walkable(x, y):
             return False
 
-        for block in self.blocks:
-            block_x = block.world_x // TILESIZE
-            block_y = block.world_y // TILESIZE
-            if x == block_x and y == block_y:
-                return False
-
         player_x = self.player.world_x // TILESIZE
         player_y = self.player.world_y // TILESIZE
         if abs(x - player_x) < 3 and abs(y - player_y) < 3:
@@ -173,29 +225,30 @@ class Game:
 
         return True
 
-    def find_valid_position(self, start_x=None, start_y=None): # Find a valid position for enemy spawning using random placement or near a start position
-        center_x = 20
-        center_y = 15
-        radius = min(40, 30) // 2 - 3
+    def find_valid_positions(self, count): # Pick up to count distinct spawn tiles at once, away from the player
+        self.spawn_cells.update(self.grid)
+        return self.spawn_cells.sample(count, self.spawn_rng,
+                                       self.player.world_x // TILESIZE, self.player.world_y // TILESIZE)
 
+    def find_valid_position(self, start_x=None, start_y=None): # Find a valid position for enemy spawning using random placement or near a start position
         if start_x is None or start_y is None:
-            for _ in range(100):
-                angle = random.uniform(0, 2 * 3.14159)
-                distance = random.uniform(0, radius)
-                x = int(center_x + distance * math.cos(angle))
-                y = int(center_y + distance * math.sin(angle))
-
-                if self.is_valid_position(x, y):
+            positions = self.find_valid_positions(1)
+            return positions[0] if positions else None
+
+        self.spawn_cells.update(self.grid)
+        nearest = self.spawn_cells.nearest_cell(start_x, start_y)
+        if nearest and abs(nearest[0] - start_x) <= 3 and abs(nearest[1] - start_y) <= 3 and \
+                self.is_valid_position(*nearest):
+            return nearest
+
+        # The closest spawn tile may be next to the player, so fall back to any valid spawn tile in the 7x7 square
+        for dx in range(-3, 4):
+            for dy in range(-3, 4):
+                x = start_x + dx
+                y = start_y + dy
+
+                if self.spawn_cells.is_spawn_cell(x, y) and self.is_valid_position(x, y):
                     return (x, y)
-        else:
-            for dx in range(-3, 4):
-                for dy in range(-3, 4):
-                    x = start_x + dx
-                    y = start_y + dy
-
-                    distance_from_center = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-                    if distance_from_center < radius and self.is_valid_position(x, y):
-                        return (x, y)
 
         return None
 
@@ -214,7 +267,7 @@ class Game:
                 self.next_wave = 1
                 self.wave_complete_delay = 5000
 
-            self.wave_complete_timer = pygame.time.get_ticks()
+            self.wave_complete_timer = self.ticks()
 
     def events(self): # Process game events like keyboard/mouse input and handle user actions
         for event in pygame.event.get():
@@ -234,19 +287,14 @@ class Game:
                     self.load_game()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    self.player.attack()
+                    self.controls.click()
 
     def save_game(self): # Save the current game state to a JSON file including map, player, and enemy data
         map_layout = []
-        for y in range(30):
+        for y in range(self.grid.height):
             row = []
-            for x in range(40):
-                tile_type = ' '
-
-                for block in self.blocks:
-                    if block.world_x // TILESIZE == x and block.world_y // TILESIZE == y:
-                        tile_type = 'B'
-                        break
+            for x in range(self.grid.width):
+                tile_type = 'B' if self.grid.is_blocked(x, y) else ' '
 
                 if self.player.world_x // TILESIZE == x and self.player.world_y // TILESIZE == y:
                     tile_type = 'P'
@@ -416,6 +464,11 @@ class Game:
     def load_level(self, level_number): # Load a specific level, creating the appropriate map and spawning enemies
         self.current_level = level_number
 
+        if self.game_state.current_wave == 5:
+            self.pathfinding_mode = BOSS_PATHFINDING
+        else:
+            self.pathfinding_mode = ENEMY_PATHFINDING
+
         old_inventory = []
         old_equipped_weapon = None
         old_equipped_armor = None
@@ -430,7 +483,6 @@ class Game:
                 sprite.kill()
 
         self.all_sprites = pygame.sprite.LayeredUpdates()
-        self.blocks = pygame.sprite.LayeredUpdates()
         self.enemies = pygame.sprite.LayeredUpdates()
         self.attacks = pygame.sprite.LayeredUpdates()
 
@@ -478,8 +530,8 @@ class Game:
                     self.createTilemap(level1_boss_map)
             else:
                 shape_types = ['rectangle', 'circle']
-                random_shape = random.choice(shape_types)
-                random_map = generate_shaped_map(40, 30, shape_type=random_shape)
+                random_shape = self.rng.choice(shape_types)
+                random_map = generate_shaped_map(40, 30, shape_type=random_shape, rng=self.rng)
                 self.createTilemap(random_map)
 
             self.spawn_wave(level_number, self.game_state.current_wave)
@@ -499,31 +551,11 @@ class Game:
             if self.player.equipped_armor:
                 self.player.max_health += self.player.equipped_armor.health
 
-        if level_number == 1:
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Macky Gee - Obsessive.mp3')
-            pygame.mixer.music.play(-1, 37)
-        elif level_number == 2:
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Macky Gee - Moments.mp3')
-            pygame.mixer.music.play(-1, 60)
-        elif level_number == 3:
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Macky Gee - Tour.mp3')
-            pygame.mixer.music.play(-1, 61)
-        elif level_number == 4:
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Macky Gee Ft. Stuart Rowe - Aftershock.mp3')
-            pygame.mixer.music.play(-1, 170)
-        elif level_number == 5:
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Nettspend - Nothing Like U (Official Music Video).mp3')
-            pygame.mixer.music.play(-1, 0)
-        else:
-            level_number = 1
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load('audio/Macky Gee - Obsessive.mp3')
-            pygame.mixer.music.play(-1, 37)
+        # The boss wave is the last of the level, so the next level's track starts decoding while it is fought
+        self.audio.play(level_number)
+        boss_wave = self.game_state.max_waves_per_level.get(level_number, 5)
+        if self.game_state.current_wave == boss_wave and level_number + 1 in LEVEL_MUSIC:
+            self.audio.prefetch(level_number + 1)
 
     def pause_game(self): # Pause the game and display the pause menu
         pause_menu = PauseMenu(self)
@@ -533,23 +565,42 @@ class Game:
             inventory_screen = InventoryScreen(self)
             inventory_screen.run()
 
-    def update(self): # Update game state including sprites, camera position, and wave transitions
-        self.all_sprites.update()
-        self.camera_offset_x = self.player.world_x - WW // 2 + TILESIZE // 2
-        self.camera_offset_y = self.player.world_y - WH // 2 + TILESIZE // 2
+        # Time spent in the menus is not owed to the simulation
+        self.clock.tick()
+
+    def ticks(self): # Return the simulation clock in milliseconds, which only advances while gameplay ticks run
+        return self.sim_tick * 1000 // SIM_RATE
+
+    def update(self): # Advance the game by one fixed tick, updating sprites, camera position and wave transitions
+        self.sim_tick += 1
         for sprite in self.all_sprites:
-            sprite.rect.x = sprite.world_x - self.camera_offset_x
-            sprite.rect.y = sprite.world_y - self.camera_offset_y
+            sprite.tick_x, sprite.tick_y = sprite.world_x, sprite.world_y
+
+        self.controls.poll(self)
+        attacked = self.controls.attack and self.player.attack()
+        if self.recorder is not None:
+            self.recorder.record(self.controls, attacked)
+        self.path_requests.process()
+        self.audio.update()
+        self.visibility.update((int((self.player.world_x + TILESIZE // 2) // TILESIZE),
+                                int((self.player.world_y + TILESIZE // 2) // TILESIZE)), self.grid)
+        if self.crowd is not None:
+            self.crowd.step(self.clearance)
+        self.all_sprites.update()
+        self.separate_enemies()
+        self.camera.follow(self.player.world_x, self.player.world_y)
 
         if self.wave_transition_pending:
-            current_time = pygame.time.get_ticks()
+            current_time = self.ticks()
             if current_time - self.wave_complete_timer >= self.wave_complete_delay:
                 self.wave_transition_pending = False
 
                 if self.next_wave == 1:
                     if self.game_state.current_level == 5:
-                        end_screen = EndScreen(self)
-                        end_screen.display(victory=True)
+                        self.victory = True
+                        if not self.headless:
+                            end_screen = EndScreen(self)
+                            end_screen.display(victory=True)
                         self.playing = False
                     else:
                         self.game_state.current_level += 1
@@ -564,26 +615,135 @@ class Game:
 
         self.check_wave_complete()
 
-    def draw(self): # Draw all game elements to the screen including sprites, UI, and notifications
+    def separate_enemies(self): # Push overlapping enemies apart once per pair, comparing only enemies in neighbouring hash buckets
+        collision_margin = TILESIZE * 0.8
+
+        # Enemies used to push each overlapping pair by 0.1 of the overlap four times a frame, once per axis from each
+        # side. One push that closes the same share of the overlap keeps that feel with a single pass over the pairs
+        push_strength = (1 - (1 - 2 * 0.1) ** 4) / 2
+
+        if self.crowd is not None:
+            self.crowd.separate(collision_margin, push_strength)
+            return
+
+        self.enemy_hash.clear()
+        for enemy in self.enemies:
+            self.enemy_hash.insert(enemy, enemy.world_x, enemy.world_y)
+
+        pushes = {}
+        for enemy, other in self.enemy_hash.candidate_pairs():
+            dx = enemy.world_x - other.world_x
+            dy = enemy.world_y - other.world_y
+            distance = math.sqrt(dx ** 2 + dy ** 2)
+
+            if 0 < distance < collision_margin:
+                overlap = collision_margin - distance
+                push_x = (dx / distance) * overlap * push_strength
+                push_y = (dy / distance) * overlap * push_strength
+
+                enemy_push = pushes.setdefault(enemy, [0.0, 0.0])
+                enemy_push[0] += push_x
+                enemy_push[1] += push_y
+                other_push = pushes.setdefault(other, [0.0, 0.0])
+                other_push[0] -= push_x
+                other_push[1] -= push_y
+
+        # Every pair is measured before anyone moves, then each enemy checks walls once for its summed push
+        for enemy, (push_x, push_y) in pushes.items():
+            enemy.apply_push(push_x, push_y)
+
+    def enemy_hit_candidates(self, left, top, right, bottom): # Yield live enemies that may overlap a world area, rebuilding the hit hash once per tick
+        # Enemies move before attacks in the sprite update, so the first query of a tick sees current positions
+        if self.hit_hash_tick != self.sim_tick:
+            self.hit_hash.clear()
+            for enemy in self.enemies:
+                self.hit_hash.insert(enemy, enemy.world_x, enemy.world_y)
+            self.hit_hash_tick = self.sim_tick
+
+        # Enemies are hashed by their top-left corner, so reach back one tile to catch boxes hanging into the area
+        for enemy in self.hit_hash.query(left - TILESIZE, top - TILESIZE, right, bottom):
+            if enemy.alive():
+                yield enemy
+
+    def enemies_in_rect(self, rect): # Return enemies whose world box overlaps a world-space rect
+        hits = []
+        for enemy in self.enemy_hit_candidates(rect.left, rect.top, rect.right, rect.bottom):
+            if (enemy.world_x < rect.right and rect.left < enemy.world_x + TILESIZE and
+                    enemy.world_y < rect.bottom and rect.top < enemy.world_y + TILESIZE):
+                hits.append(enemy)
+        return hits
+
+    def enemies_in_radius(self, x, y, radius): # Return enemies whose world box touches a circle around (x, y)
+        hits = []
+        for enemy in self.enemy_hit_candidates(x - radius, y - radius, x + radius, y + radius):
+            nearest_x = min(max(x, enemy.world_x), enemy.world_x + TILESIZE)
+            nearest_y = min(max(y, enemy.world_y), enemy.world_y + TILESIZE)
+            if (nearest_x - x) ** 2 + (nearest_y - y) ** 2 < radius * radius:
+                hits.append(enemy)
+        return hits
+
+    def first_enemy_on_segment(self, start_x, start_y, end_x, end_y, padding=0): # Return the enemy a segment reaches first, treating each box as grown by padding
+        dx = end_x - start_x
+        dy = end_y - start_y
+        closest = None
+        closest_t = INFINITY
+
+        for enemy in self.enemy_hit_candidates(min(start_x, end_x) - padding, min(start_y, end_y) - padding,
+                                               max(start_x, end_x) + padding, max(start_y, end_y) + padding):
+            # Slab test: clip the segment's 0..1 range against the box on each axis
+            t_enter, t_exit = 0.0, 1.0
+            for origin, delta, low, high in ((start_x, dx, enemy.world_x - padding, enemy.world_x + TILESIZE + padding),
+                                             (start_y, dy, enemy.world_y - padding, enemy.world_y + TILESIZE + padding)):
+                if delta == 0:
+                    if not low < origin < high:
+                        t_enter = INFINITY
+                        break
+                else:
+                    t_low = (low - origin) / delta
+                    t_high = (high - origin) / delta
+                    if t_low > t_high:
+                        t_low, t_high = t_high, t_low
+                    t_enter = max(t_enter, t_low)
+                    t_exit = min(t_exit, t_high)
+
+            if t_enter <= t_exit and t_enter < closest_t:
+                closest = enemy
+                closest_t = t_enter
+
+        return closest
+
+    def draw(self, blend=1.0): # Draw all game elements blend of the way from the previous tick to the latest one
+        self.camera.blend = blend
+        self.camera.follow(*self.camera.position(self.player))
         self.screen.fill(BLACK)
-        self.all_sprites.draw(self.screen)
+        self.terrain.update(self.grid)
+        self.terrain.draw(self.screen, self.camera)
+        self.camera.draw_sprites(self.screen, self.all_sprites)
         for enemy in self.enemies:
-            enemy.draw_health_bar(self.screen)
+            if self.camera.sees(enemy.world_x, enemy.world_y - 25, TILESIZE, TILESIZE + 25):
+                enemy.draw_health_bar(self.screen)
         self.player.draw_health_bar(self.screen)
-        for attack in self.attacks:
-            self.screen.blit(attack.image, attack.rect)
         self.ui.gold = self.gold
         self.ui.wave = self.game_state.current_wave
         self.ui.draw(self.screen)
         self.draw_direct_notification(self.screen)
-        self.clock.tick(FPS)
         pygame.display.update()
 
-    def main(self): # Main game loop that handles events, updates game state, and renders the screen
-        while self.playing:
-            self.events()
+    def frame(self): # Run however many fixed ticks the clock says are owed, then draw one interpolated frame unless headless
+        self.events()
+
+        # sim_lag counts owed ticks, so the leftover fraction is how far the frame sits between two ticks
+        self.sim_lag = min(self.sim_lag + self.clock.tick(RENDER_RATE) * SIM_RATE / 1000, MAX_SIM_STEPS)
+        while self.sim_lag >= 1 and self.playing:
             self.update()
-            self.draw()
+            self.sim_lag -= 1
+        if not self.headless:
+            self.draw(self.sim_lag)
+
+    def main(self): # Main game loop that runs frames until the player dies, wins or quits
+        self.clock.tick()
+        while self.playing:
+            self.frame()
 
     def game_over(self): # Display the game over screen when player dies
         self.game_over_screen.run()
@@ -591,22 +751,14 @@ class Game:
     def intro_screen(self): # Display the title screen at game start
         self.title_screen.run()
 
-    def get_grid(self): # Create a grid representation of the game map for pathfinding
-        grid = [[0] * (WW // TILESIZE) for _ in range(WH // TILESIZE)]
-
-        for block in self.blocks:
-            grid_x = int(block.world_x // TILESIZE)
-            grid_y = int(block.world_y // TILESIZE)
-            if 0 <= grid_y < len(grid) and 0 <= grid_x < len(grid[0]):
-                grid[grid_y][grid_x] = 1
-        return grid
-
     def run(self): # Run the complete game flow from intro to gameplay to game over
         self.intro_screen()
         if self.running:
             self.new()
             while self.running:
                 self.main()
+                if self.recorder is not None:
+                    print("Recorded run saved to", self.recorder.save(self))
                 if not self.playing and self.running:
                     self.game_over()
 
@@ -792,7 +944,7 @@ class TitleScreen: # Initialize the title screen with fonts and game reference
         while self.running:
             self.handle_events()
             self.draw()
-            self.game.clock.tick(FPS)
+            self.game.clock.tick(RENDER_RATE)
 
 class ClassSelectionScreen: # Initialize the class selection screen with available character classes
     def __init__(self, game):
@@ -887,7 +1039,7 @@ class ClassSelectionScreen: # Initialize the class selection screen with availab
         while self.running:
             self.handle_events()
             self.draw()
-            self.game.clock.tick(FPS)
+            self.game.clock.tick(RENDER_RATE)
         return self.game.player_class
 
 
@@ -923,7 +1075,7 @@ class EndScreen: # Initialize the end game screen with fonts for victory or defe
 
         waiting = True
         while waiting:
-            self.game.clock.tick(FPS)
+            self.game.clock.tick(RENDER_RATE)
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     waiting = False
@@ -1011,7 +1163,7 @@ if __name__=="__main__":
         g.run()
         if hasattr(g, 'restart_requested') and g.restart_requested:
             game_state = g.game_state
-            pygame.mixer.music.stop()
+            g.audio.stop()
             pygame.event.clear()
             del g
             g = Game(game_state)
@@ -1,8 +1,13 @@
-# Pathfinding module implementing A* algorithm for enemy movement
+# Pathfinding module implementing A*, Jump Point Search, incremental replanning, a path cache,
+# a frame-budgeted request queue and a shared flow field for enemy movement
 import heapq
+import time
+from collections import OrderedDict, deque
+
+INFINITY = float('inf')
 
 # A* pathfinding algorithm to find the shortest path between two points
-def astar_pathfinding(start, goal, grid):
+def astar_pathfinding(start, goal, grid, stats=None):
     open_list = []
     heapq.heappush(open_list, (0, start))
     came_from = {}
@@ -14,9 +19,13 @@ def astar_pathfinding(start, goal, grid):
 
         if current == goal:
             break
+        neighbors = get_neighbors(current, grid)
+        if stats is not None:
+            stats['expanded'] = stats.get('expanded', 0) + 1
+            stats['scanned'] = stats.get('scanned', 0) + len(neighbors)
 
         # Check each neighbor and update path if a better route is found
-        for neighbor in get_neighbors(current, grid):
+        for neighbor in neighbors:
             new_cost = cost_so_far[current] + 1
             if neighbor not in cost_so_far or new_cost < cost_so_far[neighbor]:
                 cost_so_far[neighbor] = new_cost
@@ -28,7 +37,7 @@ def astar_pathfinding(start, goal, grid):
 
 # Calculate Manhattan distance heuristic between two points
 def heuristic(a, b):
-    return abs(a[0] - b[0]) + abs(a[1] - b[1]) # Find valid neighboring cells that are walkable (value 0 in grid)
+    return abs(a[0] - b[0]) + abs(a[1] - b[1]) # Find valid neighboring cells that are walkable in the grid
 
 def get_neighbors(pos, grid):
     neighbors = []
@@ -37,7 +46,7 @@ def get_neighbors(pos, grid):
     # Check all four adjacent directions (up, right, down, left)
     for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
         nx, ny = x + dx, y + dy
-        if 0 <= nx < len(grid[0]) and 0 <= ny < len(grid) and grid[ny][nx] == 0:
+        if grid.is_walkable(nx, ny):
             neighbors.append((nx, ny))
     return neighbors
 
@@ -54,4 +63,443 @@ def reconstruct_path(came_from, start, goal):
             return []
     path.reverse()
     # Reverse the path to get it in start-to-goal order
-    return path
\ No newline at end of file
+    return path
+
+# Jump Point Search for 4-connected uniform-cost grids, returning the same kind of step-by-step path as astar_pathfinding
+def jps_pathfinding(start, goal, grid, stats=None):
+    open_list = []
+    heapq.heappush(open_list, (heuristic(goal, start), 0, start, (0, 0)))
+    came_from = {}
+    cost_so_far = {start: 0}
+
+    # Only jump points enter the open list, the straight runs between them are scanned without touching the heap
+    while open_list:
+        _, cost, current, direction = heapq.heappop(open_list)
+
+        if current == goal:
+            break
+        if cost > cost_so_far[current]:
+            continue
+        if stats is not None:
+            stats['expanded'] = stats.get('expanded', 0) + 1
+
+        for step in pruned_directions(current, direction, grid):
+            jump_point = jump(current, step, goal, grid, stats)
+            if jump_point is None:
+                continue
+            new_cost = cost + heuristic(current, jump_point)
+            if jump_point not in cost_so_far or new_cost < cost_so_far[jump_point]:
+                cost_so_far[jump_point] = new_cost
+                priority = new_cost + heuristic(goal, jump_point)
+                heapq.heappush(open_list, (priority, new_cost, jump_point, step))
+                came_from[jump_point] = current
+
+    return expand_jump_path(reconstruct_path(came_from, start, goal), start)
+
+# Pick the directions worth scanning from a node, given the direction it was reached in
+def pruned_directions(pos, direction, grid):
+    x, y = pos
+    dx, dy = direction
+
+    # Paths are kept horizontal-first: a horizontal run may turn vertical anywhere,
+    # but a vertical run only turns horizontal where a wall blocked the horizontal-first route
+    if dx == 0 and dy == 0:
+        return [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    if dy == 0:
+        return [(dx, 0), (0, 1), (0, -1)]
+
+    directions = [(0, dy)]
+    for side in (1, -1):
+        if grid.is_walkable(x + side, y) and not grid.is_walkable(x + side, y - dy):
+            directions.append((side, 0))
+    return directions
+
+# Scan in a straight line from pos and return the next jump point, or None if a wall is hit first.
+# stats['scanned'] counts every cell stepped onto, including the vertical scans branching off horizontal runs,
+# since on open maps those scans are where JPS spends its time rather than on heap pops
+def jump(pos, direction, goal, grid, stats=None):
+    x, y = pos
+    dx, dy = direction
+
+    while True:
+        x += dx
+        y += dy
+        if stats is not None:
+            stats['scanned'] = stats.get('scanned', 0) + 1
+        if not grid.is_walkable(x, y):
+            return None
+        if (x, y) == goal:
+            return (x, y)
+
+        if dy == 0:
+            # A horizontal run stops wherever one of the vertical scans branching off it finds something
+            if jump((x, y), (0, 1), goal, grid, stats) or jump((x, y), (0, -1), goal, grid, stats):
+                return (x, y)
+        else:
+            for side in (1, -1):
+                if grid.is_walkable(x + side, y) and not grid.is_walkable(x + side, y - dy):
+                    return (x, y)
+
+# Fill in the straight runs between consecutive jump points to get a path of single steps
+def expand_jump_path(jump_points, start):
+    path = []
+    current = start
+    for x, y in jump_points:
+        step_x = (x > current[0]) - (x < current[0])
+        step_y = (y > current[1]) - (y < current[1])
+        while current != (x, y):
+            current = (current[0] + step_x, current[1] + step_y)
+            path.append(current)
+    return path
+
+# Search engines selectable per call or per level
+search_methods = {
+    'astar': astar_pathfinding,
+    'jps': jps_pathfinding
+}
+
+# Find a path with the named search engine
+def find_path(start, goal, grid, method='astar', stats=None):
+    return search_methods[method](start, goal, grid, stats)
+
+
+class FlowField: # Initialize a shared flow field that stores every walkable cell's next step toward one goal
+    def __init__(self):
+        self.goal = None
+        self.version = None
+        self.distances = {}
+        self.next_steps = {}
+        self.searches = 0
+
+    def update(self, goal, grid): # Rebuild the field only when the goal tile or the walkability grid has changed
+        if goal == self.goal and grid.version == self.version:
+            return False
+
+        self.goal = goal
+        self.version = grid.version
+        self.distances = {}
+        self.next_steps = {}
+        self.searches += 1
+
+        if not grid.in_bounds(*goal):
+            return True
+
+        # Breadth-first pass outward from the goal, every cell points back at the cell that reached it
+        self.distances[goal] = 0
+        frontier = deque([goal])
+        while frontier:
+            current = frontier.popleft()
+            for neighbor in get_neighbors(current, grid):
+                if neighbor not in self.distances:
+                    self.distances[neighbor] = self.distances[current] + 1
+                    self.next_steps[neighbor] = current
+                    frontier.append(neighbor)
+        return True
+
+    def next_step(self, pos): # Look up the next cell to move to from pos, or None if the goal cannot be reached
+        step = self.next_steps.get(pos)
+        if step is not None or pos in self.distances:
+            return step
+
+        # Cells outside the field (e.g. an enemy pushed into a wall tile) step onto their closest reachable neighbor
+        best = None
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            neighbor = (pos[0] + dx, pos[1] + dy)
+            if neighbor in self.distances and (best is None or self.distances[neighbor] < self.distances[best]):
+                best = neighbor
+        return best
+
+    def path_from(self, start): # Follow the field from start to the goal, returning the same step list as astar_pathfinding
+        path = []
+        current = self.next_step(start)
+        while current is not None:
+            path.append(current)
+            if current == self.goal:
+                return path
+            current = self.next_steps.get(current)
+        return []
+
+
+
+class PathCache: # Initialize a bounded least-recently-used cache of search results keyed by start, goal, grid version and engine
+    def __init__(self, max_paths=256):
+        self.max_paths = max_paths
+        self.paths = OrderedDict()
+        self.tiles = {}
+        self.hits = 0
+        self.misses = 0
+
+    def find_path(self, start, goal, grid, method='astar'): # Return a cached path if one covers start, otherwise search and remember it
+        key = (start, goal, grid.version, method)
+
+        path = self.paths.get(key)
+        if path is not None:
+            self.paths.move_to_end(key)
+            self.hits += 1
+            return list(path)
+
+        # Any tile along a cached path can reuse the rest of that path, since every suffix of a shortest path is shortest
+        entry = self.tiles.get(key)
+        if entry is not None and entry[0] in self.paths:
+            owner, index = entry
+            self.paths.move_to_end(owner)
+            self.hits += 1
+            return list(self.paths[owner][index + 1:])
+
+        self.misses += 1
+        path = find_path(start, goal, grid, method)
+        self.store(key, path)
+        return path
+
+    def store(self, key, path): # Remember a path, index the tiles along it and evict the least recently used entries
+        self.paths[key] = tuple(path)
+        _, goal, version, method = key
+        for index, tile in enumerate(path[:-1]):
+            self.tiles[(tile, goal, version, method)] = (key, index)
+
+        while len(self.paths) > self.max_paths:
+            old_key, old_path = self.paths.popitem(last=False)
+            _, old_goal, old_version, old_method = old_key
+            for tile in old_path:
+                tile_key = (tile, old_goal, old_version, old_method)
+                if self.tiles.get(tile_key, (None,))[0] == old_key:
+                    del self.tiles[tile_key]
+
+    def clear(self): # Drop every cached path, e.g. when a new level is loaded
+        self.paths.clear()
+        self.tiles.clear()
+
+
+
+class IncrementalPlanner: # Initialize a Moving Target D* Lite search that one pursuer keeps and repairs between replans
+    def __init__(self):
+        self.grid = None
+        self.version = None
+        self.start = None
+        self.goal = None
+        self.km = 0
+        self.g = {}
+        self.rhs = {}
+        self.parent = {}
+        self.children = {}
+        self.open_list = []
+        self.expanded = 0
+
+    def plan(self, start, goal, grid): # Repair the previous search for the new start, goal and grid changes, then return the path
+        changes = grid.changes_since(self.version) if grid is self.grid else None
+
+        if changes is None or (start != self.start and not self.reaches_root(start)):
+            self.reset(start, goal, grid)
+        else:
+            # Costs are distances from the pursuer, so a moved goal only changes the heuristic. km grows by the
+            # distance the goal moved, which keeps the queued keys lower bounds without re-keying the open list
+            if goal != self.goal:
+                self.km += heuristic(self.goal, goal)
+                self.goal = goal
+
+            if start != self.start:
+                self.move_root(start)
+
+            # A tile changing walkability changes the cost of stepping onto it, and the change spreads from there
+            self.version = grid.version
+            for cell in changes:
+                if cell != self.start:
+                    self.update_cell(cell)
+
+        self.compute_shortest_path()
+        return self.extract_path()
+
+    def reset(self, start, goal, grid): # Throw the old search away and seed a fresh one from the pursuer
+        self.grid = grid
+        self.version = grid.version
+        self.start = start
+        self.goal = goal
+        self.km = 0
+        self.g = {}
+        self.rhs = {start: 0}
+        self.parent = {}
+        self.children = {}
+        self.open_list = [(self.calculate_key(start), start)]
+
+    def neighbors(self, cell): # The four tiles next to a cell
+        x, y = cell
+        return [(x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)]
+
+    def calculate_key(self, cell): # Priority of a cell, smaller keys are expanded first
+        best = min(self.g.get(cell, INFINITY), self.rhs.get(cell, INFINITY))
+        return (best + heuristic(cell, self.goal) + self.km, best)
+
+    def queue(self, cell): # Put a cell on the open list if its distance and lookahead disagree
+        if self.g.get(cell, INFINITY) != self.rhs.get(cell, INFINITY):
+            heapq.heappush(self.open_list, (self.calculate_key(cell), cell))
+
+    def update_cell(self, cell): # Recompute a cell's lookahead distance and parent from its neighbours
+        best = INFINITY
+        best_parent = None
+        if self.grid.is_walkable(*cell):
+            for neighbor in self.neighbors(cell):
+                cost = self.g.get(neighbor, INFINITY) + 1
+                if cost < best:
+                    best, best_parent = cost, neighbor
+
+        self.rhs[cell] = best
+        self.set_parent(cell, best_parent)
+        self.queue(cell)
+
+    def set_parent(self, cell, parent): # Hang a cell off a new parent in the search tree, or take it out of the tree
+        old_parent = self.parent.pop(cell, None)
+        if old_parent is not None:
+            self.children[old_parent].discard(cell)
+        if parent is not None:
+            self.parent[cell] = parent
+            self.children.setdefault(parent, set()).add(cell)
+
+    def reaches_root(self, cell): # Check if a cell hangs off the current root through the search tree
+        seen = set()
+        while cell is not None and cell not in seen:
+            if cell == self.start:
+                return True
+            seen.add(cell)
+            cell = self.parent.get(cell)
+        return False
+
+    def move_root(self, start): # Re-root the search tree at the pursuer's new tile, keeping the branch below it
+        # Every cell below the new root keeps its distance, all offset by the same amount. The rest of the tree,
+        # found by walking down from the old root around that branch, is cleared
+        self.set_parent(start, None)
+        deleted = [self.start]
+        for cell in deleted:
+            deleted.extend(self.children.pop(cell, ()))
+        for cell in deleted:
+            self.parent.pop(cell, None)
+            self.g.pop(cell, None)
+            self.rhs.pop(cell, None)
+
+        # Cleared cells are re-seeded from whichever kept cells border them
+        self.start = start
+        for cell in deleted:
+            self.update_cell(cell)
+
+    def compute_shortest_path(self): # Expand inconsistent cells until the goal's distance is settled
+        while self.open_list:
+            key, cell = self.open_list[0]
+            g = self.g.get(cell, INFINITY)
+            rhs = self.rhs.get(cell, INFINITY)
+
+            # Entries for cells that became consistent are stale
+            if g == rhs:
+                heapq.heappop(self.open_list)
+                continue
+
+            if key >= self.calculate_key(self.goal) and \
+                    self.rhs.get(self.goal, INFINITY) <= self.g.get(self.goal, INFINITY):
+                break
+
+            heapq.heappop(self.open_list)
+
+            # Keys queued before the goal moved or the cell's costs changed are re-queued under the current key
+            current_key = self.calculate_key(cell)
+            if key != current_key:
+                heapq.heappush(self.open_list, (current_key, cell))
+                continue
+
+            self.expanded += 1
+            if g > rhs:
+                self.g[cell] = rhs
+                for neighbor in self.neighbors(cell):
+                    if neighbor != self.start and self.rhs.get(neighbor, INFINITY) > rhs + 1 and \
+                            self.grid.is_walkable(*neighbor):
+                        self.rhs[neighbor] = rhs + 1
+                        self.set_parent(neighbor, cell)
+                        self.queue(neighbor)
+            else:
+                self.g[cell] = INFINITY
+                self.queue(cell)
+                for neighbor in self.neighbors(cell):
+                    if neighbor != self.start and self.parent.get(neighbor) == cell:
+                        self.update_cell(neighbor)
+
+    def extract_path(self): # Follow parents back from the goal to build the step list from the pursuer
+        if self.rhs.get(self.goal, INFINITY) == INFINITY:
+            return []
+
+        path = []
+        current = self.goal
+        while current != self.start:
+            path.append(current)
+            current = self.parent.get(current)
+            if current is None or len(path) > len(self.parent):
+                return []
+        path.reverse()
+        return path
+
+
+
+class PathRequestQueue: # Initialize a queue that runs path requests under a per-frame time budget, or a fixed count per frame
+    def __init__(self, budget_ms=1.0, max_requests=None):
+        self.budget = budget_ms / 1000
+        self.max_requests = max_requests
+        self.open_list = []
+        self.pending = {}
+        self.sequence = 0
+        self.completed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def submit(self, key, priority, search, callback): # Queue a request, merging it with an identical one that is still waiting
+        request = self.pending.get(key)
+        if request is None:
+            self.pending[key] = [search, [callback], time.perf_counter(), priority]
+        else:
+            request[1].append(callback)
+            if priority >= request[3]:
+                return
+            request[3] = priority
+
+        self.sequence += 1
+        heapq.heappush(self.open_list, (priority, self.sequence, key))
+
+    def process(self): # Run queued searches, lowest priority value first, until this frame's budget is spent
+        started = time.perf_counter()
+        answered = 0
+
+        # At least one request is answered every frame so the queue always drains
+        while self.open_list:
+            priority, _, key = heapq.heappop(self.open_list)
+            request = self.pending.get(key)
+            if request is None or priority != request[3]:
+                continue
+            del self.pending[key]
+
+            search, callbacks, submitted, _ = request
+            path = search()
+            finished = time.perf_counter()
+
+            latency = finished - submitted
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+            for callback in callbacks:
+                callback(path)
+
+            # A count budget answers the same requests whatever the machine's speed, which replays depend on
+            answered += 1
+            if self.max_requests is not None:
+                if answered >= self.max_requests:
+                    break
+            elif finished - started >= self.budget:
+                break
+
+    def clear(self): # Drop every waiting request, e.g. when a new level is loaded
+        self.open_list = []
+        self.pending = {}
+
+    def stats(self): # Report queue depth and request latency in milliseconds
+        average = self.total_latency / self.completed if self.completed else 0.0
+        return {
+            'depth': len(self.pending),
+            'completed': self.completed,
+            'average_latency_ms': average * 1000,
+            'max_latency_ms': self.max_latency * 1000
+        }
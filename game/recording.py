@@ -0,0 +1,99 @@
+# Compact per-tick input recordings of a seeded run, and playback of them as a controls script
+import json
+import os
+import time
+import pygame
+from config import *
+
+RECORDING_VERSION = 1
+
+# The keys gameplay reads each tick, stored as one bit each in this order
+RECORDED_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_LSHIFT)
+
+# GameState fields that shape a run from its first tick; max_waves_per_level is fixed and left out
+RECORDED_STATE = ('current_level', 'current_wave', 'gold', 'max_level_reached', 'player_level', 'player_exp',
+                  'available_points', 'health_points', 'stamina_points', 'damage_points')
+
+
+def run_summary(game): # Describe where a run ended up, to check that a replay reached the same place
+    return {
+        'ticks': game.sim_tick,
+        'level': game.game_state.current_level,
+        'wave': game.game_state.current_wave,
+        'health': game.player.health,
+        'gold': game.gold,
+        'enemies': len(game.enemies),
+        'player': [round(game.player.world_x, 3), round(game.player.world_y, 3)]
+    }
+
+
+class InputRecorder: # Initialize an empty recording; ticks are stored as runs of identical input
+    def __init__(self):
+        self.header = None
+        self.runs = []
+
+    def start(self, game): # Begin a recording with everything needed to set the same run up again
+        self.header = {
+            'version': RECORDING_VERSION,
+            'seed': game.seed,
+            'sim_rate': SIM_RATE,
+            'player_class': game.player_class,
+            'game_state': {field: getattr(game.game_state, field) for field in RECORDED_STATE}
+        }
+        self.runs = []
+
+    def record(self, controls, attacked): # Add one tick of input; clicks during the attack cooldown do nothing, so only attacks made keep their aim
+        keys = controls.pressed()
+        mask = 0
+        for bit, key in enumerate(RECORDED_KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+
+        tick = [mask]
+        if attacked:
+            tick.extend(controls.aim())
+        if self.runs and self.runs[-1][1:] == tick:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1] + tick)
+
+    def save(self, game, directory=RECORDINGS_DIR): # Write the recording with the run's summary to a new file and return its path
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "run-{}-{}.json".format(time.strftime('%Y%m%d-%H%M%S'), self.header['seed']))
+        with open(path, 'w') as recording_file:
+            json.dump(dict(self.header, result=run_summary(game), ticks=self.runs), recording_file, separators=(',', ':'))
+        return path
+
+
+class InputPlayback: # Initialize a controls script that feeds a recording's ticks back in order
+    def __init__(self, recording):
+        self.runs = recording['ticks']
+        self.run = 0
+        self.repeats = 0
+        self.length = sum(run[0] for run in self.runs)
+
+    def finished(self): # Check if every recorded tick has been played
+        return self.run >= len(self.runs)
+
+    def __call__(self, game): # Return the next tick's (held keys, world aim, attack)
+        if self.finished():
+            return (), None, False
+
+        count, mask, *target = self.runs[self.run]
+        self.repeats += 1
+        if self.repeats == count:
+            self.run += 1
+            self.repeats = 0
+
+        keys = [key for bit, key in enumerate(RECORDED_KEYS) if mask & (1 << bit)]
+        if target:
+            return keys, tuple(target), True
+        return keys, None, False
+
+
+def load_recording(path): # Read a recording file written by InputRecorder.save
+    with open(path) as recording_file:
+        recording = json.load(recording_file)
+    if recording.get('version') != RECORDING_VERSION:
+        raise ValueError(f"{path} is a version {recording.get('version')} recording, expected {RECORDING_VERSION}")
+    return recording
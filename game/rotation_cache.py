@@ -0,0 +1,24 @@
+# Pre-rotated copies of sprite images, bucketed by angle so rotating at runtime becomes a lookup
+import math
+import pygame
+
+
+class RotationCache: # Initialize an empty cache that splits a full turn into a fixed number of angle buckets
+    def __init__(self, steps):
+        self.steps = steps
+        self.images = {}
+        self.rotations = {}
+
+    def add(self, key, image): # Register the unrotated image for a key, dropping any rotations of a previous image
+        self.images[key] = image
+        self.rotations[key] = [None] * self.steps
+
+    def get(self, key, angle): # Return the image for a key rotated to the bucket nearest an angle in radians, rendering that bucket once
+        bucket = round(angle / (2 * math.pi) * self.steps) % self.steps
+        rotations = self.rotations[key]
+        image = rotations[bucket]
+        if image is None:
+            image = pygame.transform.rotate(self.images[key], -bucket * 360 / self.steps)
+            rotations[bucket] = image
+        return image
+
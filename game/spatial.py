@@ -0,0 +1,40 @@
+# Uniform spatial hash for finding nearby sprites without scanning every one of them
+import math
+
+
+class SpatialHash: # Initialize a hash that buckets items by the grid cell their position falls in
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}
+
+    def clear(self): # Remove every item, ready for the next frame's rebuild
+        self.buckets = {}
+
+    def insert(self, item, x, y): # Add an item to the bucket under the point (x, y)
+        key = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [item]
+        else:
+            bucket.append(item)
+
+    def candidate_pairs(self): # Yield each pair of items in the same or touching buckets exactly once
+        for (cell_x, cell_y), bucket in self.buckets.items():
+            for i in range(len(bucket)):
+                for j in range(i + 1, len(bucket)):
+                    yield bucket[i], bucket[j]
+
+            # Only half of the surrounding buckets are visited so every neighbouring pair comes up once
+            for offset_x, offset_y in [(1, 0), (-1, 1), (0, 1), (1, 1)]:
+                neighbor = self.buckets.get((cell_x + offset_x, cell_y + offset_y))
+                if neighbor:
+                    for item in bucket:
+                        for other in neighbor:
+                            yield item, other
+
+    def query(self, left, top, right, bottom): # Yield every item whose bucket overlaps the area between the given corners
+        for cell_y in range(math.floor(top / self.cell_size), math.floor(bottom / self.cell_size) + 1):
+            for cell_x in range(math.floor(left / self.cell_size), math.floor(right / self.cell_size) + 1):
+                bucket = self.buckets.get((cell_x, cell_y))
+                if bucket:
+                    yield from bucket
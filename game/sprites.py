@@ -1,20 +1,9 @@
 import pygame, math, random, numpy
 import pygame.gfxdraw
 from config import *
-from pathfinding import astar_pathfinding
-from main import Game
+from pathfinding import IncrementalPlanner
 
 
-class Spritesheet: # Initialize a spritesheet object with the given image file
-    def __init__(self, file):
-        self.sheet = pygame.image.load(file).convert()
-
-    def get_sprite(self, x, y, width, height): # Extract a sprite from the spritesheet at the specified coordinates and dimensions
-        sprite = pygame.Surface([width, height])
-        sprite.blit(self.sheet, (0,0), (x, y, width, height))
-        sprite.set_colorkey(BLACK)
-        return sprite
-
 class Player(pygame.sprite.Sprite): # Initialize the player character with position, class type, and base attributes
     def __init__(self, game, x, y, player_class):
         super().__init__()
@@ -38,7 +27,6 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
         self.inventory = []
         self.equipped_weapon = None
         self.equipped_armor = None
-        self.projectile = None
 
         self.player_class = player_class if player_class else 'mage'
 
@@ -58,16 +46,15 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
             self.damage = 40
             self.attack_cooldown = 400
 
-        self.last_attack_time = 0
+        self.last_attack_time = -self.attack_cooldown
 
-        sprite_coordinates = {
-            "warrior": (0, 96),
-            "mage": (32, 128),
-            "rogue": (96, 0)
+        sprite_names = {
+            "warrior": "male barbarian",
+            "mage": "male wizard",
+            "rogue": "rogue"
         }
 
-        x, y = sprite_coordinates.get(self.player_class, (32, 128))
-        self.image = self.game.character_spritesheet.get_sprite(x, y, TILESIZE, TILESIZE)
+        self.image = self.game.atlas.sprite('rogues', sprite_names.get(self.player_class, "male wizard"))
 
         self.level = game.game_state.player_level
         self.exp = game.game_state.player_exp
@@ -115,24 +102,17 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
         self.y_change = 0
 
         if self.stamina < self.max_stamina:
-            self.stamina += self.stamina_regen_rate * (1 / FPS)
+            self.stamina += self.stamina_regen_rate * (1 / SIM_RATE)
             if self.stamina > self.max_stamina:
                 self.stamina = self.max_stamina
 
-        if self.projectile:
-            self.world_x += math.cos(self.direction) * self.speed
-            self.world_y += math.sin(self.direction) * self.speed
-
-            self.rect.centerx = self.world_x - self.game.camera_offset_x
-            self.rect.centery = self.world_y - self.game.camera_offset_y
-
         self.game.ui.stamina = self.stamina
         self.game.ui.max_stamina = self.max_stamina
 
     def movement(self): # Handle player movement input and apply speed modifiers
-        keys = pygame.key.get_pressed()
+        keys = self.game.controls.pressed()
         new_facing = self.facing
-        current_time = pygame.time.get_ticks()
+        current_time = self.game.ticks()
 
         self.x_change = 0
         self.y_change = 0
@@ -141,7 +121,7 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
 
         if keys[pygame.K_LSHIFT] and self.stamina > 5:
             speed_multiplier = 1.7
-            self.stamina -= 20 * (4/FPS)
+            self.stamina -= 20 * (4/SIM_RATE)
             if self.stamina < 0:
                 self.stamina = 0
 
@@ -164,8 +144,9 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
     def collide_blocks(self, direction): # Check for collisions with blocks and adjust player position accordingly
         temp_rect = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
 
-        for block in self.game.blocks:
-            block_rect = pygame.Rect(block.world_x, block.world_y, TILESIZE, TILESIZE)
+        # Only the wall tiles under the player's bounding box can collide with it
+        for tile_x, tile_y in self.game.grid.solid_tiles_in_rect(temp_rect):
+            block_rect = pygame.Rect(tile_x * TILESIZE, tile_y * TILESIZE, TILESIZE, TILESIZE)
             if temp_rect.colliderect(block_rect):
                 if direction == 'x':
                     if self.x_change > 0:
@@ -188,21 +169,19 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
             self.game.playing = False
 
     def draw_health_bar(self, surface): # Draw a health bar above the player
+        screen_x, screen_y = self.game.camera.to_screen(*self.game.camera.position(self))
         health_ratio = self.health / self.max_health
         bar_width = TILESIZE
         bar_height = 5
-        pygame.draw.rect(surface, RED, (self.rect.x, self.rect.y - 10, bar_width, bar_height))
-        pygame.draw.rect(surface, (0, 255, 0), (self.rect.x, self.rect.y - 10, bar_width * health_ratio, bar_height))
+        pygame.draw.rect(surface, RED, (screen_x, screen_y - 10, bar_width, bar_height))
+        pygame.draw.rect(surface, (0, 255, 0), (screen_x, screen_y - 10, bar_width * health_ratio, bar_height))
 
-    def attack(self): # Create an attack based on player class and mouse position
-        current_time = pygame.time.get_ticks()
+    def attack(self): # Create an attack based on player class and aim, returning whether one was made
+        current_time = self.game.ticks()
         if current_time - self.last_attack_time >= self.attack_cooldown:
             self.last_attack_time = current_time
 
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-
-            world_mouse_x = mouse_x + self.game.camera_offset_x
-            world_mouse_y = mouse_y + self.game.camera_offset_y
+            world_mouse_x, world_mouse_y = self.game.controls.aim()
 
             dir_x = world_mouse_x - self.world_x
             dir_y = world_mouse_y - self.world_y
@@ -220,7 +199,6 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
                     self.world_x,
                     self.world_y,
                     angle,
-                    self.game.fireball,
                     "fireball",
                     self.damage,
                     projectile=True
@@ -245,7 +223,6 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
                     self.world_x + dir_x * TILESIZE / 2,
                     self.world_y + dir_y * TILESIZE / 2,
                     angle,
-                    self.game.sword_swing,
                     "sword_swing",
                     self.damage,
                     projectile=False,
@@ -258,53 +235,50 @@ class Player(pygame.sprite.Sprite): # Initialize the player character with posit
                     self.world_x,
                     self.world_y,
                     angle,
-                    self.game.dagger,
                     "dagger",
                     self.damage,
                     projectile=False
                 )
                 self.last_attack_time -= self.attack_cooldown * 0.2
+            return True
+        return False
+
+
+class TerrainLayer: # Initialize a world-sized surface with the level's floor and wall tiles painted onto it once
+    def __init__(self, grid, ground_image, block_image):
+        self.ground_image = ground_image
+        self.block_image = block_image
+        self.version = None
+        self.surface = pygame.Surface((grid.width * TILESIZE, grid.height * TILESIZE)).convert()
+        self.update(grid)
+
+    def update(self, grid): # Repaint the tiles changed since the last paint, or every tile if those changes are no longer known
+        if grid.version == self.version:
+            return False
+
+        changed = grid.changes_since(self.version)
+        if changed is None:
+            self.surface.fill(BLACK)
+            changed = [(x, y) for y in range(grid.height) for x in range(grid.width)]
+
+        for x, y in changed:
+            position = (x * TILESIZE, y * TILESIZE)
+            self.surface.fill(BLACK, (position, (TILESIZE, TILESIZE)))
+            self.surface.blit(self.ground_image, position)
+            if grid.is_blocked(x, y):
+                self.surface.blit(self.block_image, position)
+
+        self.version = grid.version
+        return True
 
-
-
-
-class Block(pygame.sprite.Sprite): # Initialize a block/wall object at the specified position
-    def __init__(self, game, x, y, image=None):
-        self.game = game
-        self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.blocks
-        pygame.sprite.Sprite.__init__(self, self.groups)
-
-        self.world_x = x * TILESIZE
-        self.world_y = y * TILESIZE
-
-        self.rect = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
-
-        if image:
-            self.image = image
-        else:
-            self.image = self.game.terrain_spritesheet.get_sprite(0, 32, TILESIZE, TILESIZE)
-
-
-class Ground(pygame.sprite.Sprite): # Initialize a ground tile at the specified position
-    def __init__(self, game, x, y, image=None):
-        self.game = game
-        self._layer = GROUND_LAYER
-        self.groups = self.game.all_sprites
-        pygame.sprite.Sprite.__init__(self, self.groups)
-
-        self.world_x = x * TILESIZE
-        self.world_y = y * TILESIZE
-
-        self.rect = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
-
-        if image:
-            self.image = image
-        else:
-            self.image = self.game.terrain_spritesheet.get_sprite(0, 192, TILESIZE, TILESIZE)
+    def draw(self, surface, camera): # Blit the part of the terrain under the camera, the screen clips the rest
+        surface.blit(self.surface, camera.to_screen(0, 0))
 
 
 class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, and level-scaled attributes
+    crowd = None
+    crowd_slot = None
+
     def __init__(self, game, x, y, image=None, level=None):
         super().__init__()
 
@@ -323,7 +297,7 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         if image:
             self.image = image
         else:
-            self.image = self.game.enemy_spritesheet.get_sprite(64, 0, TILESIZE, TILESIZE)
+            self.image = self.game.atlas.sprite('monsters', 'goblin')
 
         self.image.set_colorkey(BLACK)
 
@@ -339,11 +313,15 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         self.max_health = int(self.base_health * (1 + (self.level * 0.15)))
         self.health = self.max_health
         self.damage = int(self.damage * (1 + (self.level * 0.1)))
+        self.level_label = None
+        self.level_label_level = None
 
         self.path = []
         self.path_index = 0
         self.path_update_time = 0
         self.path_update_delay = 1000
+        self.planner = IncrementalPlanner()
+        self.path_request_pending = False
 
         self.velocity_x = 0
         self.velocity_y = 0
@@ -351,18 +329,31 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         self.deceleration = 0.1
         self.max_speed = ENEMY_SPEED
 
+        if self.game.crowd is not None:
+            self.game.crowd.add(self)
+
+    def kill(self): # Leave the crowd arrays before the sprite is removed from its groups
+        if self.crowd is not None:
+            self.crowd.remove(self)
+        super().kill()
+
     def update(self): # Update enemy position, handle collisions, and attack player on contact
         prev_x = self.world_x
         prev_y = self.world_y
-        self.movement()
+
+        # Batched enemies already had their velocity stepped by the crowd this frame
+        if self.crowd is None:
+            self.movement()
+        else:
+            self.x_change = self.velocity_x
+            self.y_change = self.velocity_y
 
         self.world_x += self.x_change
         self.collide_blocks('x')
-        self.collide_enemies('x')
+        self.limit_speed()
 
         self.world_y += self.y_change
         self.collide_blocks('y')
-        self.collide_enemies('y')
 
         self.detect_and_handle_corner_stuck(prev_x, prev_y)
 
@@ -373,7 +364,7 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         enemy_rect = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
 
         if enemy_rect.colliderect(player_rect):
-            current_time = pygame.time.get_ticks()
+            current_time = self.game.ticks()
             if not hasattr(self, 'last_attack_time') or current_time - self.last_attack_time > 1000:
                 self.last_attack_time = current_time
                 self.game.player.take_damage(self.damage)
@@ -386,7 +377,7 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
             self.corner_adjustment_direction = None
             self.corner_adjustment_time = 0
 
-        current_time = pygame.time.get_ticks()
+        current_time = self.game.ticks()
 
         actual_movement = math.sqrt((self.world_x - prev_x) ** 2 + (self.world_y - prev_y) ** 2)
 
@@ -415,43 +406,30 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
 
     def find_corner_adjustment_direction(self): # Find a valid direction to move when stuck on a corner
         directions = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
-        test_distance = TILESIZE * 2
+        tile_x = int((self.world_x + TILESIZE // 2) // TILESIZE)
+        tile_y = int((self.world_y + TILESIZE // 2) // TILESIZE)
 
-        clear_directions = []
+        current_dir = [0, 0]
+        vel_magnitude = math.sqrt(self.velocity_x ** 2 + self.velocity_y ** 2)
+        if vel_magnitude > 0.1:
+            current_dir = [self.velocity_x / vel_magnitude, self.velocity_y / vel_magnitude]
 
+        # Prefer the direction whose tile two steps out has the most room, then the one turning furthest from the stuck heading
+        best_dir = None
+        best_score = None
         for dx, dy in directions:
-            test_x = self.world_x + dx * test_distance
-            test_y = self.world_y + dy * test_distance
-
-            if test_x < 0 or test_x >= 40 * TILESIZE or test_y < 0 or test_y >= 30 * TILESIZE:
+            if not self.game.grid.is_walkable(tile_x + dx, tile_y + dy):
+                continue
+            clearance = self.game.clearance.clearance(tile_x + dx * 2, tile_y + dy * 2)
+            if clearance == 0:
                 continue
 
-            test_rect = pygame.Rect(test_x, test_y, TILESIZE, TILESIZE)
-
-            clear = True
-            for block in self.game.blocks:
-                block_rect = pygame.Rect(block.world_x, block.world_y, TILESIZE, TILESIZE)
-                if test_rect.colliderect(block_rect):
-                    clear = False
-                    break
-
-            if clear:
-                clear_directions.append((dx, dy))
-
-        if clear_directions:
-            current_dir = [0, 0]
-            vel_magnitude = math.sqrt(self.velocity_x ** 2 + self.velocity_y ** 2)
-            if vel_magnitude > 0.1:
-                current_dir = [self.velocity_x / vel_magnitude, self.velocity_y / vel_magnitude]
-
-            best_dir = None
-            best_diff = -1
-            for dx, dy in clear_directions:
-                dir_diff = (dx - current_dir[0]) ** 2 + (dy - current_dir[1]) ** 2
-                if dir_diff > best_diff:
-                    best_diff = dir_diff
-                    best_dir = (dx, dy)
+            score = (clearance, (dx - current_dir[0]) ** 2 + (dy - current_dir[1]) ** 2)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_dir = (dx, dy)
 
+        if best_dir:
             self.corner_adjustment_direction = best_dir
         else:
             self.corner_adjustment_direction = (-self.velocity_x, -self.velocity_y)
@@ -475,51 +453,31 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
                     self.world_y = valid_pos[1] * TILESIZE
                     self.stuck_count = 0
 
-    def movement(self): # Handle enemy movement toward player using pathfinding or direct line of sight
-        current_time = pygame.time.get_ticks()
+    def movement(self): # Steer the enemy's velocity toward its current target using acceleration and deceleration
+        target = self.select_target()
 
-        if not hasattr(self, 'previous_positions'):
-            self.previous_positions = []
-
-        self.previous_positions.append((self.world_x, self.world_y))
-        if len(self.previous_positions) > 10:
-            self.previous_positions.pop(0)
+        target_vx = 0
+        target_vy = 0
 
-        if len(self.previous_positions) == 10:
-            positions_set = set([(int(x), int(y)) for x, y in self.previous_positions])
-            if len(positions_set) <= 2:
-                self.update_path()
-                self.path_update_time = current_time
-
-        if self.has_line_of_sight_to_player():
-            dx = self.game.player.world_x - self.world_x
-            dy = self.game.player.world_y - self.world_y
+        if target is not None:
+            dx = target[0] - self.world_x
+            dy = target[1] - self.world_y
 
             distance = max(1, math.sqrt(dx * dx + dy * dy))
             target_vx = (dx / distance) * self.max_speed
             target_vy = (dy / distance) * self.max_speed
-        else:
-            if not self.path or current_time - self.path_update_time > self.path_update_delay:
-                self.update_path()
-                self.path_update_time = current_time
 
-            target_vx = 0
-            target_vy = 0
+            # Lean away from walls the enemy is brushing past so it rounds corners instead of catching on them
+            push_x, push_y = self.game.clearance.wall_push(int((self.world_x + TILESIZE // 2) // TILESIZE),
+                                                           int((self.world_y + TILESIZE // 2) // TILESIZE))
+            target_vx += push_x * ENEMY_WALL_AVOIDANCE * self.max_speed
+            target_vy += push_y * ENEMY_WALL_AVOIDANCE * self.max_speed
 
-            if self.path and self.path_index < len(self.path):
-                target_x, target_y = self.path[self.path_index]
-                target_world_x = target_x * TILESIZE
-                target_world_y = target_y * TILESIZE
-
-                dx = target_world_x - self.world_x
-                dy = target_world_y - self.world_y
-
-                if abs(dx) < self.max_speed and abs(dy) < self.max_speed:
-                    self.path_index += 1
-                else:
-                    distance = max(1, math.sqrt(dx * dx + dy * dy))
-                    target_vx = (dx / distance) * self.max_speed
-                    target_vy = (dy / distance) * self.max_speed
+            # The lean only bends the heading, it never lets the enemy go faster than its top speed
+            speed = math.sqrt(target_vx * target_vx + target_vy * target_vy)
+            if speed > self.max_speed:
+                target_vx = (target_vx / speed) * self.max_speed
+                target_vy = (target_vy / speed) * self.max_speed
 
         if abs(target_vx - self.velocity_x) > self.acceleration:
             self.velocity_x += self.acceleration if target_vx > self.velocity_x else -self.acceleration
@@ -539,6 +497,47 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         self.x_change = self.velocity_x
         self.y_change = self.velocity_y
 
+    def select_target(self): # Choose the world position to head for this frame using pathfinding or direct line of sight
+        current_time = self.game.ticks()
+
+        if not hasattr(self, 'previous_positions'):
+            self.previous_positions = []
+
+        self.previous_positions.append((self.world_x, self.world_y))
+        if len(self.previous_positions) > 10:
+            self.previous_positions.pop(0)
+
+        if len(self.previous_positions) == 10:
+            positions_set = set([(int(x), int(y)) for x, y in self.previous_positions])
+            if len(positions_set) <= 2:
+                self.update_path()
+                self.path_update_time = current_time
+
+        if self.has_line_of_sight_to_player():
+            return (self.game.player.world_x, self.game.player.world_y)
+
+        if not self.path or current_time - self.path_update_time > self.path_update_delay:
+            self.update_path()
+            self.path_update_time = current_time
+
+        if self.path and self.path_index < len(self.path):
+            target_x, target_y = self.path[self.path_index]
+            target_world_x = target_x * TILESIZE
+            target_world_y = target_y * TILESIZE
+
+            dx = target_world_x - self.world_x
+            dy = target_world_y - self.world_y
+
+            if abs(dx) < self.max_speed and abs(dy) < self.max_speed:
+                self.path_index += 1
+                return None
+            return (target_world_x, target_world_y)
+
+        # While a queued path request is pending the enemy steers straight at the player
+        if self.path_request_pending:
+            return (self.game.player.world_x, self.game.player.world_y)
+        return None
+
     def has_line_of_sight_to_player(self): # Check if enemy has direct line of sight to the player without obstacles
         start_x = self.world_x + TILESIZE // 2
         start_y = self.world_y + TILESIZE // 2
@@ -552,6 +551,10 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
         if distance < TILESIZE:
             return True
 
+        # The player's visibility map already answers this for every tile in one lookup
+        if self.game.line_of_sight_mode == 'visibility':
+            return self.game.visibility.is_visible(int(start_x // TILESIZE), int(start_y // TILESIZE))
+
         if distance > 0:
             dx /= distance
             dy /= distance
@@ -564,29 +567,68 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
             grid_x = int(check_x // TILESIZE)
             grid_y = int(check_y // TILESIZE)
 
-            for block in self.game.blocks:
-                block_grid_x = int(block.world_x // TILESIZE)
-                block_grid_y = int(block.world_y // TILESIZE)
-
-                if grid_x == block_grid_x and grid_y == block_grid_y:
-                    return False
+            if self.game.grid.is_blocked(grid_x, grid_y):
+                return False
 
         return True
 
     def update_path(self): # Calculate a new pathfinding route to the player
-        grid = self.game.get_grid()
+        grid = self.game.grid
         start = (int(self.world_x // TILESIZE), int(self.world_y // TILESIZE))
         goal = (int(self.game.player.world_x // TILESIZE), int(self.game.player.world_y // TILESIZE))
 
-        self.path = astar_pathfinding(start, goal, grid)
+        mode = self.game.pathfinding_mode
+
+        if mode == 'flowfield':
+            self.game.flow_field.update(goal, grid)
+            self.path = self.game.flow_field.path_from(start)
+            self.path_index = 0
+            return
+
+        # Per-enemy searches go through the frame-budgeted queue, the old path is kept until the answer arrives
+        if self.path_request_pending:
+            return
+        if mode == 'incremental':
+            key = (self.planner, start, goal)
+            search = lambda: self.planner.plan(start, goal, grid)
+        else:
+            key = (start, goal, grid.version, mode)
+            search = lambda: self.game.path_cache.find_path(start, goal, grid, mode)
+
+        self.path_request_pending = True
+        priority = abs(goal[0] - start[0]) + abs(goal[1] - start[1])
+        self.game.path_requests.submit(key, priority, search, lambda path: self.receive_path(path, start))
+
+    def receive_path(self, path, start): # Follow a path delivered by the request queue from where the enemy is now
+        self.path_request_pending = False
+        if not self.alive():
+            return
+
+        # The enemy kept moving while the request waited, so join the path at the step nearest to it now
+        tile = (int(self.world_x // TILESIZE), int(self.world_y // TILESIZE))
+        steps = [start] + path
+        distances = [abs(step[0] - tile[0]) + abs(step[1] - tile[1]) for step in steps]
+        nearest = distances.index(min(distances))
+
+        # A path that no longer passes next to the enemy is dropped, which makes it ask again next frame
+        if distances[nearest] > 1:
+            self.path = []
+            self.path_index = 0
+            return
+
+        # On the path the next step is the target, next to it the enemy steps back onto it first
+        if distances[nearest] == 0:
+            nearest += 1
+        self.path = steps[nearest:]
         self.path_index = 0
 
     def collide_blocks(self, direction): # Handle collisions with blocks and adjust enemy position
         buffer = 2
         temp_rect = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
 
-        for block in self.game.blocks:
-            block_rect = pygame.Rect(block.world_x, block.world_y, TILESIZE, TILESIZE)
+        # Only the wall tiles under the enemy's bounding box can collide with it
+        for tile_x, tile_y in self.game.grid.solid_tiles_in_rect(temp_rect):
+            block_rect = pygame.Rect(tile_x * TILESIZE, tile_y * TILESIZE, TILESIZE, TILESIZE)
             if temp_rect.colliderect(block_rect):
                 if direction == 'x':
                     if self.x_change > 0:
@@ -604,33 +646,26 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
                     self.y_change = 0
                     self.velocity_y = 0
 
-    def collide_enemies(self, direction): # Handle collisions with other enemies to prevent overlapping
-        push_strength = 0.1
-        separation_strength = 0.15
-        collision_margin = TILESIZE * 0.8
-
-        for enemy in self.game.enemies:
-            if enemy != self:
-                dx = self.world_x - enemy.world_x
-                dy = self.world_y - enemy.world_y
-                distance = math.sqrt(dx ** 2 + dy ** 2)
-
-                if distance < collision_margin:
-                    overlap = collision_margin - distance
-                    if distance > 0:
-                        push_x = (dx / distance) * overlap * push_strength
-                        push_y = (dy / distance) * overlap * push_strength
-
-                        self.world_x += push_x
-                        self.world_y += push_y
-                        enemy.world_x -= push_x
-                        enemy.world_y -= push_y
-
-                        self.x_change += (dx / distance) * separation_strength
-                        self.y_change += (dy / distance) * separation_strength
-                        enemy.x_change -= (dx / distance) * separation_strength
-                        enemy.y_change -= (dy / distance) * separation_strength
+    def apply_push(self, push_x, push_y): # Move the enemy by a separation push one axis at a time, stopping at walls like collide_blocks
+        for direction, push in (('x', push_x), ('y', push_y)):
+            before = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
+            if direction == 'x':
+                self.world_x += push
+            else:
+                self.world_y += push
+            after = pygame.Rect(self.world_x, self.world_y, TILESIZE, TILESIZE)
+
+            # Only walls the push itself reached stop it, an overlap the enemy already had is left to collide_blocks
+            for tile_x, tile_y in self.game.grid.solid_tiles_in_rect(after):
+                block_rect = pygame.Rect(tile_x * TILESIZE, tile_y * TILESIZE, TILESIZE, TILESIZE)
+                if after.colliderect(block_rect) and not before.colliderect(block_rect):
+                    if direction == 'x':
+                        self.world_x = block_rect.left - TILESIZE if push > 0 else block_rect.right
+                    else:
+                        self.world_y = block_rect.top - TILESIZE if push > 0 else block_rect.bottom
+                    break
 
+    def limit_speed(self): # Clamp the remaining movement for this frame to the enemy speed limit
         speed = math.sqrt(self.x_change ** 2 + self.y_change ** 2)
         if speed > ENEMY_SPEED:
             self.x_change = (self.x_change / speed) * ENEMY_SPEED
@@ -639,7 +674,7 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
     def take_damage(self, amount): # Reduce enemy health when damaged and handle death rewards
         was_boss = self.max_health >= 500
         self.health -= amount
-        self.hit_time = pygame.time.get_ticks()
+        self.hit_time = self.game.ticks()
 
         if self.health <= 0:
             exp_reward = 50 + (self.level * 2)
@@ -659,7 +694,7 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
                         self.game.player.inventory.append(item)
 
                     weapon_index = (current_level - 1) * 2
-                    if random.random() < 0.5:
+                    if self.game.rng.random() < 0.5:
                         weapon_to_drop = weapon_index
                     else:
                         weapon_to_drop = weapon_index + 1
@@ -675,19 +710,46 @@ class Enemy(pygame.sprite.Sprite): # Initialize an enemy with position, image, a
             self.kill()
 
     def draw_health_bar(self, surface): # Draw a health bar and level indicator above the enemy
+        screen_x, screen_y = self.game.camera.to_screen(*self.game.camera.position(self))
         health_ratio = self.health / self.max_health
         bar_width = TILESIZE
         bar_height = 5
-        pygame.draw.rect(surface, RED, (self.rect.x, self.rect.y - 10, bar_width, bar_height))
-        pygame.draw.rect(surface, (0, 255, 0), (self.rect.x, self.rect.y - 10, bar_width * health_ratio, bar_height))
+        pygame.draw.rect(surface, RED, (screen_x, screen_y - 10, bar_width, bar_height))
+        pygame.draw.rect(surface, (0, 255, 0), (screen_x, screen_y - 10, bar_width * health_ratio, bar_height))
+
+        # The label only changes with the level, so it is fetched again only then
+        if self.level_label_level != self.level:
+            self.level_label = self.game.text.render(f"Lvl {self.level}", 16, (255, 255, 255))
+            self.level_label_level = self.level
+        surface.blit(self.level_label, (screen_x, screen_y - 25))
+
+
+def crowd_attribute(array_name, column=None): # Build a BatchedEnemy attribute that reads and writes the enemy's row of a crowd array
+    def get(self):
+        array = getattr(self.crowd, array_name)
+        return array.item(self.crowd_slot) if column is None else array.item(self.crowd_slot, column)
+
+    def set(self, value):
+        if column is None:
+            getattr(self.crowd, array_name)[self.crowd_slot] = value
+        else:
+            getattr(self.crowd, array_name)[self.crowd_slot, column] = value
 
-        level_font = pygame.font.Font(None, 16)
-        level_text = level_font.render(f"Lvl {self.level}", True, (255, 255, 255))
-        surface.blit(level_text, (self.rect.x, self.rect.y - 25))
+    return property(get, set)
+
+
+class BatchedEnemy(Enemy): # An enemy whose movement state lives in its crowd's arrays; Crowd.add switches enemies to this class and Crowd.remove back
+    world_x = crowd_attribute('position', 0)
+    world_y = crowd_attribute('position', 1)
+    velocity_x = crowd_attribute('velocity', 0)
+    velocity_y = crowd_attribute('velocity', 1)
+    max_speed = crowd_attribute('max_speed')
+    acceleration = crowd_attribute('acceleration')
+    deceleration = crowd_attribute('deceleration')
 
 
 class Attack(pygame.sprite.Sprite): # Initialize an attack object with position, direction, and damage properties
-    def __init__(self, game, x, y, direction, sprite_sheet, attack_type, damage, projectile=False, aoe=False,
+    def __init__(self, game, x, y, direction, attack_type, damage, projectile=False, aoe=False,
                  aoe_radius=0):
         super().__init__()
 
@@ -706,75 +768,79 @@ class Attack(pygame.sprite.Sprite): # Initialize an attack object with position,
         self.aoe = aoe
         self.aoe_radius = aoe_radius
 
-        if attack_type == "sword_swing":
-            self.original_image = game.warrior_attack_sprite
-            self.original_image.set_colorkey(BLACK)
-        elif attack_type == "dagger":
-            self.original_image = game.rogue_attack_sprite
-            self.original_image.set_colorkey(BLACK)
-        else:
-            self.original_image = sprite_sheet.get_sprite(0, 0, TILESIZE, TILESIZE)
-            self.original_image.set_colorkey(WHITE)
-
-
-
-        angle_degrees = math.degrees(direction)
-        self.image = pygame.transform.rotate(self.original_image, -angle_degrees)
+        self.image = game.attack_rotations.get(attack_type, direction)
 
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
 
-        self.creation_time = pygame.time.get_ticks()
+        self.creation_time = self.game.ticks()
         if self.projectile:
             self.lifespan = 1000
         else:
             self.lifespan = 200
 
-        if self.aoe:
-            self.aoe_rect = pygame.Rect(0, 0, self.aoe_radius * 2, self.aoe_radius * 2)
-            self.aoe_rect.center = self.rect.center
-
     def update(self): # Update attack position and check for collisions with enemies
-        if pygame.time.get_ticks() - self.creation_time > self.lifespan:
+        if self.game.ticks() - self.creation_time > self.lifespan:
             self.kill()
             return
 
         if self.projectile:
+            previous_x, previous_y = self.world_x, self.world_y
             self.world_x += math.cos(self.direction) * self.speed
             self.world_y += math.sin(self.direction) * self.speed
 
-            screen_x = self.world_x - self.game.camera_offset_x
-            screen_y = self.world_y - self.game.camera_offset_y
-            self.rect.center = (screen_x, screen_y)
-
-        hits = []
-        for enemy in self.game.enemies:
-            if self.aoe:
-                self.aoe_rect.center = (self.world_x - self.game.camera_offset_x,
-                                        self.world_y - self.game.camera_offset_y)
-                if self.aoe_rect.colliderect(enemy.rect):
-                    hits.append(enemy)
-            else:
-                if self.rect.colliderect(enemy.rect):
-                    hits.append(enemy)
-                    if not self.projectile:
-                        break
-
-        for enemy in hits:
-            enemy.take_damage(self.damage)
-            if not self.aoe and not self.projectile:
-                self.kill()
-                return
-            elif self.projectile:
+            # Stop the fireball where this frame's travel first enters a wall, however far it moved
+            wall_t = self.game.grid.raycast(previous_x, previous_y, self.world_x, self.world_y)
+            if wall_t is not None:
+                self.world_x = previous_x + (self.world_x - previous_x) * wall_t
+                self.world_y = previous_y + (self.world_y - previous_y) * wall_t
+
+            # Sweep the fireball's centre along this frame's travel so fast shots cannot skip past an enemy
+            enemy = self.game.first_enemy_on_segment(previous_x, previous_y, self.world_x, self.world_y,
+                                                     padding=TILESIZE / 2)
+            if enemy:
+                enemy.take_damage(self.damage)
+            if enemy or wall_t is not None:
                 self.kill()
-                return
+            return
+
+        if self.aoe:
+            for enemy in self.game.enemies_in_radius(self.world_x, self.world_y, self.aoe_radius):
+                enemy.take_damage(self.damage)
+            return
+
+        hits = self.game.enemies_in_rect(pygame.Rect(self.world_x, self.world_y, self.rect.width, self.rect.height))
+        if hits:
+            hits[0].take_damage(self.damage)
+            self.kill()
+
+
+class HudWidget: # Initialize a HUD element that re-renders its surface only when the value it shows changes
+    def __init__(self, value, render):
+        self.value = value
+        self.render = render
+        self.shown = None
+        self.surface = None
+        self.rect = None
+
+    def refresh(self): # Re-render if the value changed, returning the screen area that needs recompositing
+        value = self.value()
+        if self.surface is not None and value == self.shown:
+            return None
+
+        old_rect = self.rect
+        self.shown = value
+        self.surface, self.rect = self.render(value)
+        if old_rect is None:
+            return self.rect
+        return self.rect.union(old_rect)
 
 
 class UI: # Initialize the user interface with fonts and display elements
     def __init__(self, game):
         self.game = game
-        self.font = pygame.font.Font(None, 32)
-        self.small_font = pygame.font.Font(None, 24)
+        self.font = game.text.font(32)
+        self.small_font = game.text.font(24)
 
         self.health_color = (220, 50, 50)
         self.stamina_color = (50, 150, 220)
@@ -784,6 +850,8 @@ class UI: # Initialize the user interface with fonts and display elements
         self.item_slot = pygame.Surface((64, 64))
         self.item_slot.fill((50, 50, 50))
         pygame.draw.rect(self.item_slot, (100, 100, 100), (0, 0, 64, 64), 2)
+        self.weapon_label = game.text.render("Weapon", 24, (200, 200, 200))
+        self.armor_label = game.text.render("Armor", 24, (200, 200, 200))
 
         self.gold = 0
         self.wave = 1
@@ -796,104 +864,139 @@ class UI: # Initialize the user interface with fonts and display elements
         self.message_timer = 0
         self.message_duration = 0
 
+        self.health_bar_x = WW - 200 - 20
+        self.health_bar_y = 20
+        self.stamina_bar_y = self.health_bar_y + 20 + 5
+        self.exp_bar_y = self.stamina_bar_y + 10 + 5
+        self.weapon_slot_x = WW // 2 - 70
+        self.armor_slot_x = WW // 2 + 6
+        self.slots_y = WH - 80
+
+        # Widgets are composited into one overlay, and only the areas they cover are blitted to the screen
+        self.overlay = pygame.Surface((WW, WH), pygame.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 0))
+        self.blit_areas = []
+        self.widgets = [
+            HudWidget(lambda: (int(self.game.player.health), self.game.player.max_health,
+                               int(200 * self.game.player.health / self.game.player.max_health)), self.render_health),
+            HudWidget(lambda: int(200 * self.stamina / self.max_stamina), self.render_stamina),
+            HudWidget(lambda: self.gold, self.render_gold),
+            HudWidget(lambda: self.wave, self.render_wave),
+            HudWidget(lambda: (int(200 * self.game.player.exp / self.game.player.exp_to_next_level),
+                               self.game.player.level), self.render_exp),
+            HudWidget(lambda: (self.game.player.equipped_weapon, self.game.player.equipped_armor), self.render_slots),
+            HudWidget(self.visible_message, self.render_message)
+        ]
+
     def show_message(self, text, duration): # Display a temporary message on the screen
         self.message = text
-        self.message_timer = pygame.time.get_ticks()
+        self.message_timer = self.game.ticks()
         self.message_duration = duration
 
-    def draw(self, surface): # Draw all UI elements including health/stamina bars, inventory, and messages
-        health_ratio = self.game.player.health / self.game.player.max_health
-        health_bar_width = 200
-        health_bar_height = 20
-        health_bar_x = WW - health_bar_width - 20
-        health_bar_y = 20
-
-        pygame.draw.rect(surface, (0, 0, 0), (health_bar_x, health_bar_y, health_bar_width, health_bar_height))
-        pygame.draw.rect(surface, self.health_color,
-                         (health_bar_x, health_bar_y, health_bar_width * health_ratio, health_bar_height))
-        health_text = self.font.render(f"{int(self.game.player.health)}/{self.game.player.max_health}", True,
-                                       (255, 255, 255))
-        surface.blit(health_text, (health_bar_x + health_bar_width // 2 - health_text.get_width() // 2,
-                                   health_bar_y + health_bar_height // 2 - health_text.get_height() // 2))
-
-        stamina_ratio = self.stamina / self.max_stamina
-        stamina_bar_width = 200
-        stamina_bar_height = 10
-        stamina_bar_x = health_bar_x
-        stamina_bar_y = health_bar_y + health_bar_height + 5
-
-        pygame.draw.rect(surface, (0, 0, 0), (stamina_bar_x, stamina_bar_y, stamina_bar_width, stamina_bar_height))
-        pygame.draw.rect(surface, self.stamina_color,
-                         (stamina_bar_x, stamina_bar_y, stamina_bar_width * stamina_ratio, stamina_bar_height))
-
-        gold_text = self.font.render(f"Gold: {self.gold}", True, self.gold_color)
-        surface.blit(gold_text, (WW - gold_text.get_width() - 20, stamina_bar_y + stamina_bar_height + 20))
-
-        wave_text = self.font.render(f"Wave: {self.wave}", True, (255, 255, 255))
-        surface.blit(wave_text, (WW // 2 - wave_text.get_width() // 2, 20))
-
-        weapon_slot_x = WW // 2 - 70
-        armor_slot_x = WW // 2 + 6
-        slots_y = WH - 80
-
-        surface.blit(self.item_slot, (weapon_slot_x, slots_y))
-        weapon_text = self.small_font.render("Weapon", True, (200, 200, 200))
-        surface.blit(weapon_text, (weapon_slot_x + 32 - weapon_text.get_width() // 2, slots_y + 70))
-
-        surface.blit(self.item_slot, (armor_slot_x, slots_y))
-        armor_text = self.small_font.render("Armor", True, (200, 200, 200))
-        surface.blit(armor_text, (armor_slot_x + 32 - armor_text.get_width() // 2, slots_y + 70))
-
-        exp_ratio = self.game.player.exp / self.game.player.exp_to_next_level
-        exp_bar_width = 200
-        exp_bar_height = 10
-        exp_bar_x = stamina_bar_x
-        exp_bar_y = stamina_bar_y + stamina_bar_height + 5
-
-        pygame.draw.rect(surface, (0, 0, 0), (exp_bar_x, exp_bar_y, exp_bar_width, exp_bar_height))
-        pygame.draw.rect(surface, (100, 100, 255), (exp_bar_x, exp_bar_y, exp_bar_width * exp_ratio, exp_bar_height))
-
-        level_text = self.font.render(f"Level: {self.game.player.level}", True, (255, 255, 255))
-        surface.blit(level_text, (exp_bar_x - level_text.get_width() - 10, exp_bar_y))
-
-        current_time = pygame.time.get_ticks()
-        if self.message and current_time - self.message_timer < self.message_duration:
-            message_text = self.font.render(self.message, True, (255, 255, 255))
-            message_bg = pygame.Surface((message_text.get_width() + 20, message_text.get_height() + 10))
-            message_bg.set_alpha(180)
-            message_bg.fill((0, 0, 0))
-
-            x = WW // 2 - message_text.get_width() // 2
-            y = WH // 4
-
-            surface.blit(message_bg, (x - 10, y - 5))
-            surface.blit(message_text, (x, y))
-
-        weapon_slot_x = WW // 2 - 70
-        armor_slot_x = WW // 2 + 6
-        slots_y = WH - 80
-
-        surface.blit(self.item_slot, (weapon_slot_x, slots_y))
-        surface.blit(self.item_slot, (armor_slot_x, slots_y))
-
-        if self.game.player.equipped_weapon:
-            weapon_image = self.game.player.equipped_weapon.image
-            surface.blit(weapon_image, (weapon_slot_x + 32 - weapon_image.get_width() // 2,
-                                        slots_y + 32 - weapon_image.get_height() // 2))
-
-        if self.game.player.equipped_armor:
-            armor_image = self.game.player.equipped_armor.image
-            surface.blit(armor_image, (armor_slot_x + 32 - armor_image.get_width() // 2,
-                                       slots_y + 32 - armor_image.get_height() // 2))
-
-        weapon_text = self.small_font.render("Weapon", True, (200, 200, 200))
-        surface.blit(weapon_text, (weapon_slot_x + 32 - weapon_text.get_width() // 2, slots_y + 70))
-
-        armor_text = self.small_font.render("Armor", True, (200, 200, 200))
-        surface.blit(armor_text, (armor_slot_x + 32 - armor_text.get_width() // 2, slots_y + 70))
-
-
-
-
+    def visible_message(self): # Return the message while it is still on screen, otherwise None
+        if self.message and self.game.ticks() - self.message_timer < self.message_duration:
+            return self.message
+        return None
+
+    def compose(self, pieces): # Paint (surface or colour, screen rect) pieces onto one transparent surface spanning them
+        area = pieces[0][1].unionall([rect for _, rect in pieces[1:]])
+        surface = pygame.Surface((max(1, area.width), max(1, area.height)), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        for piece, rect in pieces:
+            if isinstance(piece, pygame.Surface):
+                surface.blit(piece, rect.move(-area.x, -area.y))
+            else:
+                surface.fill(piece, rect.move(-area.x, -area.y))
+        return surface, area
+
+    def render_health(self, value): # Render the health bar with its current/max text centred on it
+        health, max_health, width = value
+        x, y = self.health_bar_x, self.health_bar_y
+        health_text = self.font.render(f"{health}/{max_health}", True, (255, 255, 255))
+        return self.compose([
+            ((0, 0, 0), pygame.Rect(x, y, 200, 20)),
+            (self.health_color, pygame.Rect(x, y, width, 20)),
+            (health_text, health_text.get_rect(topleft=(x + 100 - health_text.get_width() // 2,
+                                                        y + 10 - health_text.get_height() // 2)))
+        ])
+
+    def render_stamina(self, width): # Render the stamina bar under the health bar
+        x, y = self.health_bar_x, self.stamina_bar_y
+        return self.compose([
+            ((0, 0, 0), pygame.Rect(x, y, 200, 10)),
+            (self.stamina_color, pygame.Rect(x, y, width, 10))
+        ])
+
+    def render_gold(self, gold): # Render the gold counter right-aligned under the bars
+        gold_text = self.font.render(f"Gold: {gold}", True, self.gold_color)
+        return self.compose([(gold_text, gold_text.get_rect(topleft=(WW - gold_text.get_width() - 20,
+                                                                     self.stamina_bar_y + 10 + 20)))])
+
+    def render_wave(self, wave): # Render the wave number centred at the top of the screen
+        wave_text = self.font.render(f"Wave: {wave}", True, (255, 255, 255))
+        return self.compose([(wave_text, wave_text.get_rect(topleft=(WW // 2 - wave_text.get_width() // 2, 20)))])
+
+    def render_exp(self, value): # Render the experience bar with the player's level to its left
+        width, level = value
+        x, y = self.health_bar_x, self.exp_bar_y
+        level_text = self.font.render(f"Level: {level}", True, (255, 255, 255))
+        return self.compose([
+            ((0, 0, 0), pygame.Rect(x, y, 200, 10)),
+            ((100, 100, 255), pygame.Rect(x, y, width, 10)),
+            (level_text, level_text.get_rect(topleft=(x - level_text.get_width() - 10, y)))
+        ])
+
+    def render_slots(self, equipped): # Render the weapon and armor slots with their labels and equipped items
+        pieces = []
+        for slot_x, label, item in [(self.weapon_slot_x, self.weapon_label, equipped[0]),
+                                    (self.armor_slot_x, self.armor_label, equipped[1])]:
+            pieces.append((self.item_slot, pygame.Rect(slot_x, self.slots_y, 64, 64)))
+            if item:
+                pieces.append((item.image, item.image.get_rect(topleft=(slot_x + 32 - item.image.get_width() // 2,
+                                                                        self.slots_y + 32 - item.image.get_height() // 2))))
+            pieces.append((label, label.get_rect(topleft=(slot_x + 32 - label.get_width() // 2, self.slots_y + 70))))
+        return self.compose(pieces)
+
+    def render_message(self, message): # Render the temporary message on a translucent backing, or nothing once it has expired
+        if message is None:
+            return pygame.Surface((0, 0), pygame.SRCALPHA), pygame.Rect(WW // 2, WH // 4, 0, 0)
+
+        message_text = self.font.render(message, True, (255, 255, 255))
+        x = WW // 2 - message_text.get_width() // 2
+        y = WH // 4
+        return self.compose([
+            ((0, 0, 0, 180), pygame.Rect(x - 10, y - 5, message_text.get_width() + 20, message_text.get_height() + 10)),
+            (message_text, message_text.get_rect(topleft=(x, y)))
+        ])
+
+    def refresh(self): # Re-render changed widgets and recomposite only the overlay areas they touched
+        dirty = [area for area in (widget.refresh() for widget in self.widgets) if area is not None]
+        if not dirty:
+            return
 
+        for area in dirty:
+            self.overlay.set_clip(area)
+            self.overlay.fill((0, 0, 0, 0))
+            for widget in self.widgets:
+                if widget.rect.colliderect(area):
+                    self.overlay.blit(widget.surface, widget.rect)
+        self.overlay.set_clip(None)
+
+        # Merge overlapping widget areas so no overlay pixel is blended onto the screen twice
+        areas = [widget.rect for widget in self.widgets if widget.rect.width and widget.rect.height]
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(areas)):
+                for j in range(i + 1, len(areas)):
+                    if areas[i].colliderect(areas[j]):
+                        areas[i] = areas[i].union(areas.pop(j))
+                        merged = True
+                        break
+                if merged:
+                    break
+        self.blit_areas = [(self.overlay, area.topleft, area) for area in areas]
 
+    def draw(self, surface): # Draw the HUD overlay, re-rendering only the widgets whose values changed
+        self.refresh()
+        surface.blits(self.blit_areas, False)
@@ -0,0 +1,60 @@
+# Shared test setup: import the game modules from game/ and run pygame without a window or sound
+import os
+import random
+import sys
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GAME_DIR)
+
+# Images, maps and music are loaded by paths relative to the game directory
+os.chdir(GAME_DIR)
+
+import config
+from grid import WalkGrid
+
+BOSS_MAPS = [config.level1_boss_map, config.level2_boss_map, config.level3_boss_map,
+             config.level4_boss_map, config.level5_boss_map]
+
+
+def generated_maps(count, seed=1): # Build procedurally generated maps the way load_level does, from a fixed seed
+    rng = random.Random(seed)
+    return [config.generate_shaped_map(40, 30, shape_type=rng.choice(['rectangle', 'circle']), rng=rng)
+            for _ in range(count)]
+
+
+def walkable_tiles(grid): # List every walkable tile of a grid
+    return [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.is_walkable(x, y)]
+
+
+@pytest.fixture(params=range(len(BOSS_MAPS) + 5), ids=lambda index: f"boss{index + 1}" if index < len(BOSS_MAPS)
+                else f"generated{index - len(BOSS_MAPS) + 1}")
+def level_grid(request): # Every boss map, then a handful of generated maps
+    if request.param < len(BOSS_MAPS):
+        return WalkGrid.from_tilemap(BOSS_MAPS[request.param])
+    return WalkGrid.from_tilemap(generated_maps(5)[request.param - len(BOSS_MAPS)])
+
+
+@pytest.fixture(scope='session')
+def display(): # A dummy display, so images can be converted the way the game does
+    import pygame
+    pygame.display.init()
+    pygame.font.init()
+    return pygame.display.set_mode((64, 64))
+
+
+@pytest.fixture
+def game(display): # A seeded headless game on its first wave, with the enemies cleared away for the test to place its own
+    from headless import FixedClock, auto_pilot
+    from controls import ScriptedControls
+    from main import Game, GameState
+
+    game = Game(GameState(), headless=True, clock=FixedClock(), controls=ScriptedControls(auto_pilot), seed=1)
+    game.player_class = 'mage'
+    game.new()
+    for enemy in list(game.enemies):
+        enemy.kill()
+    return game
@@ -0,0 +1,145 @@
+# Tests for the preprocessed asset cache file and the sprite atlas slices stored in it
+import json
+import os
+import shutil
+import struct
+import pygame
+import pytest
+from assets import AssetCache, ASSET_CACHE_MAGIC
+from atlas import SpriteAtlas
+from config import BLACK
+
+ATLAS_SPRITES = [('monsters', '1.a'), ('monsters', '3.c'), ('rogues', '2.b'), ('tiles', '1.a')]
+
+
+def pixels(surface): # The pixels and colour key a surface is drawn with
+    pixel_format = 'RGBA' if surface.get_flags() & pygame.SRCALPHA else 'RGB'
+    return surface.get_size(), pixel_format, pygame.image.tobytes(surface, pixel_format), surface.get_colorkey()
+
+
+def pattern(alpha): # A small surface with a different colour in every pixel
+    surface = pygame.Surface((5, 3), pygame.SRCALPHA if alpha else 0)
+    for x in range(5):
+        for y in range(3):
+            surface.set_at((x, y), (x * 50, y * 80, 200, 40 + x * 40) if alpha else (x * 50, y * 80, 200))
+    return surface.convert_alpha() if alpha else surface.convert()
+
+
+@pytest.fixture
+def source(tmp_path): # A copy of a real image to stamp, so the test can change it
+    path = str(tmp_path / 'source.png')
+    shutil.copy('img/shot_fireball.png', path)
+    return path
+
+
+def test_cached_images_come_back_identical_after_a_save(display, tmp_path, source):
+    path = str(tmp_path / 'cache.bin')
+    keyed = pattern(False)
+    keyed.set_colorkey(BLACK)
+    built = [pattern(True), keyed]
+
+    cache = AssetCache(path)
+    assert cache.images('images', [source], lambda: built) is built
+    cache.save()
+
+    reloaded = AssetCache(path)
+    restored = reloaded.images('images', [source], lambda: pytest.fail('a cached entry was rebuilt'))
+    assert (reloaded.hits, reloaded.misses) == (1, 0)
+    assert [pixels(surface) for surface in restored] == [pixels(surface) for surface in built]
+
+
+@pytest.mark.parametrize('change', ['mtime', 'size'])
+def test_changing_a_source_file_rebuilds_its_images(display, tmp_path, source, change):
+    path = str(tmp_path / 'cache.bin')
+    cache = AssetCache(path)
+    cache.images('images', [source], lambda: [pattern(False)])
+    cache.save()
+
+    if change == 'mtime':
+        status = os.stat(source)
+        os.utime(source, ns=(status.st_atime_ns, status.st_mtime_ns + 1_000_000_000))
+    else:
+        with open(source, 'ab') as source_file:
+            source_file.write(b'\0')
+
+    rebuilt = []
+    reloaded = AssetCache(path)
+    reloaded.images('images', [source], lambda: rebuilt.append(True) or [pattern(False)])
+    assert rebuilt and (reloaded.hits, reloaded.misses) == (0, 1)
+
+
+@pytest.mark.parametrize('damage', ['garbage', 'truncated', 'empty'])
+def test_a_damaged_cache_file_is_rebuilt(display, tmp_path, source, damage):
+    path = str(tmp_path / 'cache.bin')
+    cache = AssetCache(path)
+    cache.images('images', [source], lambda: [pattern(True)])
+    cache.save()
+
+    with open(path, 'rb') as cache_file:
+        data = cache_file.read()
+    with open(path, 'wb') as cache_file:
+        cache_file.write({'garbage': b'not a cache file at all', 'truncated': data[:20], 'empty': b''}[damage])
+
+    reloaded = AssetCache(path)
+    assert reloaded.images('images', [source], lambda: [pattern(True)])
+    assert (reloaded.hits, reloaded.misses) == (0, 1)
+
+    # Saving replaces the damaged file with a readable one
+    reloaded.save()
+    assert AssetCache(path).images('images', [source], lambda: pytest.fail('a cached entry was rebuilt'))
+
+
+def rewrite_cache(path, edit_header, edit_data): # Rewrite a saved cache file with its header and pixel data changed
+    with open(path, 'rb') as cache_file:
+        magic = cache_file.read(len(ASSET_CACHE_MAGIC))
+        header_size, = struct.unpack('<I', cache_file.read(4))
+        header = json.loads(cache_file.read(header_size).decode('utf-8'))
+        data = cache_file.read()
+    header = json.dumps(edit_header(header)).encode('utf-8')
+    with open(path, 'wb') as cache_file:
+        cache_file.write(magic + struct.pack('<I', len(header)) + header + edit_data(data))
+
+
+def grow_first_image(header): # Claim a larger size than the stored pixels hold
+    for entry in header['entries'].values():
+        entry['images'][0]['size'][1] += 1
+    return header
+
+
+@pytest.mark.parametrize('damage', [
+    (lambda header: header, lambda data: data[:len(data) // 2]),
+    (lambda header: {'version': header['version']}, lambda data: data),
+    (grow_first_image, lambda data: data)
+], ids=['truncated pixels', 'missing entries', 'wrong size'])
+def test_a_cache_file_with_a_valid_header_but_bad_entries_is_rebuilt(display, tmp_path, source, damage):
+    path = str(tmp_path / 'cache.bin')
+    cache = AssetCache(path)
+    cache.images('images', [source], lambda: [pattern(True), pattern(False)])
+    cache.save()
+    rewrite_cache(path, *damage)
+
+    reloaded = AssetCache(path)
+    rebuilt = reloaded.images('images', [source], lambda: [pattern(True), pattern(False)])
+    assert [pixels(surface) for surface in rebuilt] == [pixels(pattern(True)), pixels(pattern(False))]
+    assert (reloaded.hits, reloaded.misses) == (0, 1)
+
+    reloaded.save()
+    assert AssetCache(path).images('images', [source], lambda: pytest.fail('a cached entry was rebuilt'))
+
+
+def test_cached_atlas_sprites_match_freshly_cut_ones(display, tmp_path):
+    path = str(tmp_path / 'cache.bin')
+    uncached = SpriteAtlas('img/32rogues')
+    expected = [pixels(uncached.sprite(*name)) for name in ATLAS_SPRITES]
+
+    cache = AssetCache(path)
+    building = SpriteAtlas('img/32rogues', cache)
+    assert [pixels(building.sprite(*name)) for name in ATLAS_SPRITES] == expected
+    cache.save()
+
+    # A launch that finds every slice cached never decodes a sheet
+    cache = AssetCache(path)
+    cached = SpriteAtlas('img/32rogues', cache)
+    assert [pixels(cached.sprite(*name)) for name in ATLAS_SPRITES] == expected
+    assert cache.hits == len(ATLAS_SPRITES)
+    assert not cached.sheets
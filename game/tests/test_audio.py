@@ -0,0 +1,59 @@
+# Tests for decoding and switching level music on the dummy audio driver
+import struct
+import wave
+from concurrent.futures import Future
+import pygame
+import pytest
+from audio_manager import AudioManager
+
+
+@pytest.fixture
+def audio(): # A music manager on the dummy audio driver
+    manager = AudioManager()
+    if not manager.enabled:
+        pytest.skip('no mixer available')
+    yield manager
+    manager.stop()
+    manager.loader.shutdown()
+
+
+def write_track(path, seconds): # Write a 16-bit stereo WAV at the mixer's rate whose every frame holds its own index
+    frequency = pygame.mixer.get_init()[0]
+    with wave.open(str(path), 'wb') as track:
+        track.setnchannels(2)
+        track.setsampwidth(2)
+        track.setframerate(frequency)
+        track.writeframes(b''.join(struct.pack('<hh', frame % 32000, -(frame % 32000))
+                                   for frame in range(int(seconds * frequency))))
+    return str(path)
+
+
+def test_decode_trims_the_track_to_its_start_offset(audio, tmp_path):
+    path = write_track(tmp_path / 'track.wav', 1.0)
+    whole = audio.decode(path, 0)
+    trimmed = audio.decode(path, 0.25)
+
+    assert trimmed.get_length() == pytest.approx(0.75, abs=0.001)
+    raw = whole.get_raw()
+    assert trimmed.get_raw() == raw[len(raw) - len(trimmed.get_raw()):]
+
+
+def test_decode_keeps_the_whole_track_when_the_offset_is_past_its_end(audio, tmp_path):
+    path = write_track(tmp_path / 'track.wav', 0.1)
+    assert audio.decode(path, 5).get_length() == pytest.approx(0.1, abs=0.001)
+
+
+def test_decode_reports_a_missing_track_as_none(audio, tmp_path):
+    assert audio.decode(str(tmp_path / 'missing.ogg'), 0) is None
+
+
+def test_a_decode_that_failed_in_the_worker_leaves_the_level_silent(audio):
+    failed = Future()
+    failed.set_exception(RuntimeError('decoder crashed'))
+    track = audio.track_for(1)
+    audio.tracks[track] = failed
+
+    audio.play(1)
+    assert audio.current_track == track
+    assert audio.pending_track is None
+    assert audio.channel is None
@@ -0,0 +1,105 @@
+# Tests for enemy movement against the level's walls: wall avoidance, separation pushes and teleporting stuck enemies free
+import math
+import pygame
+import pytest
+from config import TILESIZE
+from crowd import Crowd
+from sprites import Enemy, BatchedEnemy
+from conftest import walkable_tiles
+
+
+def wall_overlaps(game, enemy): # List the wall tiles an enemy's box overlaps
+    return game.grid.solid_tiles_in_rect(pygame.Rect(enemy.world_x, enemy.world_y, TILESIZE, TILESIZE))
+
+
+def test_enemies_only_read_through_to_crowd_arrays_while_batched(game):
+    plain = Enemy(game, 3, 4)
+    assert type(plain) is Enemy
+    assert plain.__dict__['world_x'] == 3 * TILESIZE
+
+    crowd = Crowd()
+    game.crowd = crowd
+    batched = Enemy(game, 5, 6)
+    assert type(batched) is BatchedEnemy
+    batched.world_x += 7
+    batched.velocity_y = 2.5
+    assert crowd.position[batched.crowd_slot].tolist() == [5 * TILESIZE + 7, 6 * TILESIZE]
+    assert crowd.velocity[batched.crowd_slot].tolist() == [0, 2.5]
+
+    # Leaving the crowd hands the state back to plain attributes
+    crowd.remove(batched)
+    assert type(batched) is Enemy
+    assert (batched.world_x, batched.world_y, batched.velocity_y) == (5 * TILESIZE + 7, 6 * TILESIZE, 2.5)
+    assert not crowd.members
+
+
+@pytest.mark.parametrize('batched', [False, True], ids=['unbatched', 'crowd'])
+def test_leaning_away_from_a_wall_keeps_enemies_under_their_top_speed(game, batched):
+    game.crowd = Crowd() if batched else None
+    grid = game.grid
+    game.clearance.update(grid)
+    tile_x, tile_y = next((x, y) for x, y in walkable_tiles(grid)
+                          if grid.is_blocked(x, y - 1) and all(grid.is_walkable(x + step, y) for step in range(1, 6)))
+
+    # Running along a wall with the target straight ahead, so the wall push is added at right angles to full speed
+    enemy = Enemy(game, tile_x, tile_y)
+    enemy.select_target = lambda: ((tile_x + 10) * TILESIZE, tile_y * TILESIZE)
+    for _ in range(30):
+        if batched:
+            game.crowd.step(game.clearance)
+        else:
+            enemy.movement()
+
+    assert enemy.velocity_y > 0
+    assert math.hypot(enemy.velocity_x, enemy.velocity_y) <= enemy.max_speed + 1e-9
+
+
+@pytest.mark.parametrize('batched', [False, True], ids=['unbatched', 'crowd'])
+def test_separation_does_not_push_enemies_into_walls(game, batched):
+    game.crowd = Crowd() if batched else None
+    grid = game.grid
+    tile_x, tile_y = next((x, y) for x, y in walkable_tiles(grid)
+                          if grid.is_blocked(x + 1, y) and grid.is_walkable(x - 1, y))
+
+    # The right enemy rests against the wall, the left one overlaps it and shoves it further right
+    pressed = Enemy(game, tile_x, tile_y)
+    pusher = Enemy(game, tile_x, tile_y)
+    pusher.world_x -= TILESIZE * 0.3
+    for _ in range(10):
+        game.separate_enemies()
+
+    assert not wall_overlaps(game, pressed)
+    assert not wall_overlaps(game, pusher)
+    assert pusher.world_x < pressed.world_x
+
+
+def test_stuck_enemy_inside_a_wall_is_moved_back_onto_the_floor(game):
+    grid = game.grid
+    player_x = int(game.player.world_x // TILESIZE)
+    player_y = int(game.player.world_y // TILESIZE)
+
+    # A wall tile touching a spawn tile, well away from the player so the spawn tile is a valid landing spot
+    wall_x, wall_y = next((x, y) for y in range(grid.height) for x in range(grid.width)
+                          if grid.is_blocked(x, y) and abs(x - player_x) > 6 and abs(y - player_y) > 6 and
+                          any(game.spawn_cells.is_spawn_cell(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))))
+
+    enemy = Enemy(game, wall_x, wall_y)
+    enemy.stuck_count = 11
+    enemy.corner_adjustment_direction = (0, 0)
+    enemy.apply_corner_adjustment()
+
+    tile = (int(enemy.world_x // TILESIZE), int(enemy.world_y // TILESIZE))
+    assert tile != (wall_x, wall_y)
+    assert grid.is_walkable(*tile)
+    assert enemy.stuck_count == 0
+
+
+def test_stuck_enemy_near_the_player_is_moved_to_a_spawn_tile_clear_of_the_player(game):
+    player_x = int(game.player.world_x // TILESIZE)
+    player_y = int(game.player.world_y // TILESIZE)
+
+    # The spawn tile closest to the player's own tile is too close to the player, the fallback scan finds another
+    position = game.find_valid_position(player_x, player_y)
+    assert position is not None
+    assert game.is_valid_position(*position)
+    assert max(abs(position[0] - player_x), abs(position[1] - player_y)) <= 3
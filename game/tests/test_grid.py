@@ -0,0 +1,111 @@
+# Tests for the walk grid's raycast and the per-tile maps built from it: visibility, wall clearance and spawn tiles
+import random
+from config import TILESIZE
+from grid import VisibilityMap, FreeCellIndex, ClearanceMap
+from conftest import walkable_tiles
+
+
+def random_point(rng, tile): # A random pixel inside a tile, kept off its edges so no ray passes exactly through a corner
+    return (tile[0] * TILESIZE + rng.uniform(1, TILESIZE - 1), tile[1] * TILESIZE + rng.uniform(1, TILESIZE - 1))
+
+
+def tile_at(grid, start, end, t): # The tile under the point a fraction t along a segment
+    x = start[0] + (end[0] - start[0]) * t
+    y = start[1] + (end[1] - start[1]) * t
+    return int(x // TILESIZE), int(y // TILESIZE)
+
+
+def test_raycast_stops_at_the_first_wall_on_the_segment(level_grid):
+    rng = random.Random(7)
+    tiles = walkable_tiles(level_grid)
+    samples = 2000
+    for _ in range(200):
+        start = random_point(rng, rng.choice(tiles))
+        end = random_point(rng, rng.choice(tiles))
+        hit = level_grid.raycast(*start, *end)
+
+        # Every sample before the hit is clear, and the segment is inside a wall just past it. A ray that only
+        # clips a wall's corner can slip between samples, so samples alone cannot prove a hit is missing
+        stop = samples if hit is None else int(hit * samples)
+        assert all(level_grid.is_walkable(*tile_at(level_grid, start, end, step / samples)) for step in range(stop))
+        if hit is not None:
+            assert not level_grid.is_walkable(*tile_at(level_grid, start, end, hit + 1e-9))
+
+
+def test_raycast_is_symmetric(level_grid):
+    rng = random.Random(8)
+    tiles = walkable_tiles(level_grid)
+    for _ in range(300):
+        start = random_point(rng, rng.choice(tiles))
+        end = random_point(rng, rng.choice(tiles))
+        assert (level_grid.raycast(*start, *end) is None) == (level_grid.raycast(*end, *start) is None)
+
+
+def test_visibility_is_symmetric_between_floor_tiles(level_grid):
+    rng = random.Random(9)
+    tiles = walkable_tiles(level_grid)
+    origins = rng.sample(tiles, 12)
+    maps = {}
+    for origin in origins:
+        maps[origin] = VisibilityMap()
+        maps[origin].update(origin, level_grid)
+
+    for origin in origins:
+        for other in origins:
+            assert maps[origin].is_visible(*other) == maps[other].is_visible(*origin)
+
+
+def test_visibility_sees_the_walls_around_the_origin_and_nothing_outside_the_grid(level_grid):
+    tiles = walkable_tiles(level_grid)
+    origin = tiles[len(tiles) // 2]
+    visibility = VisibilityMap()
+    visibility.update(origin, level_grid)
+
+    x, y = origin
+    for neighbor in ((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+        if level_grid.in_bounds(*neighbor):
+            assert visibility.is_visible(*neighbor)
+    assert not visibility.is_visible(-1, y)
+    assert not visibility.is_visible(level_grid.width, y)
+
+
+def test_visibility_recomputes_only_when_the_origin_or_grid_changes(level_grid):
+    tiles = walkable_tiles(level_grid)
+    visibility = VisibilityMap()
+    assert visibility.update(tiles[0], level_grid)
+    assert not visibility.update(tiles[0], level_grid)
+    assert visibility.update(tiles[1], level_grid)
+
+    level_grid.set_blocked(*tiles[-1])
+    assert visibility.update(tiles[1], level_grid)
+    assert visibility.updates == 3
+
+
+def test_spawn_index_finds_the_closest_spawn_tile_from_every_tile(level_grid):
+    index = FreeCellIndex()
+    index.update(level_grid)
+    spawn_cells = [tuple(cell) for cell in index.cells.tolist()]
+    assert all(level_grid.is_walkable(*cell) for cell in spawn_cells)
+
+    # Walls included, so an enemy pushed into one still has somewhere to go
+    for y in range(level_grid.height):
+        for x in range(level_grid.width):
+            nearest = index.nearest_cell(x, y)
+            closest = min(abs(cell[0] - x) + abs(cell[1] - y) for cell in spawn_cells)
+            assert nearest in spawn_cells
+            assert abs(nearest[0] - x) + abs(nearest[1] - y) == closest
+    assert index.nearest_cell(-1, 0) is None
+
+
+def test_clearance_matches_the_brute_force_distance_to_the_nearest_wall(level_grid):
+    level_grid.set_blocked(*walkable_tiles(level_grid)[0])
+    clearance = ClearanceMap()
+    clearance.update(level_grid)
+
+    # Chessboard distance to the closest wall tile, with the ring of tiles just off the map counted as walls
+    walls = [(x, y) for y in range(-1, level_grid.height + 1) for x in range(-1, level_grid.width + 1)
+             if not level_grid.in_bounds(x, y) or level_grid.is_blocked(x, y)]
+    for y in range(level_grid.height):
+        for x in range(level_grid.width):
+            assert clearance.clearance(x, y) == min(max(abs(x - wall_x), abs(y - wall_y)) for wall_x, wall_y in walls)
+    assert clearance.clearance(-1, 0) == 0
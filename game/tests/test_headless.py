@@ -0,0 +1,41 @@
+# Tests for headless runs: seeded runs repeat exactly, and a recorded run replays to the same state
+import functools
+import glob
+import os
+from headless import run_headless, run_replay
+from recording import InputRecorder, load_recording
+
+SUMMARY_FIELDS = ('level', 'wave', 'victory', 'died', 'stalled', 'health', 'gold', 'ticks')
+
+
+def record_run(tmp_path, monkeypatch, seed): # Run the auto pilot with a recorder that saves under tmp_path, and load what it saved
+    recorder = InputRecorder()
+    monkeypatch.setattr(recorder, 'save', functools.partial(recorder.save, directory=str(tmp_path)))
+    result = run_headless(seed=seed, max_seconds=60, recorder=recorder)
+    path, = glob.glob(os.path.join(str(tmp_path), '*.json'))
+    return result, load_recording(path)
+
+
+def test_runs_with_the_same_seed_end_in_the_same_state(display):
+    first = run_headless(seed=11, max_seconds=30)
+    second = run_headless(seed=11, max_seconds=30)
+    assert {field: first[field] for field in SUMMARY_FIELDS} == {field: second[field] for field in SUMMARY_FIELDS}
+
+
+def test_a_recorded_run_replays_to_the_same_state(display, tmp_path, monkeypatch):
+    result, recording = record_run(tmp_path, monkeypatch, seed=12)
+    assert recording['result']['ticks'] == result['ticks']
+    assert recording['result']['health'] == result['health']
+
+    # The auto pilot attacked, so the recording carries aimed ticks as well as movement
+    assert any(len(run) > 2 for run in recording['ticks'])
+
+    replay = run_replay(recording)
+    assert replay['matches']
+    assert replay['replayed'] == recording['result']
+
+
+def test_a_replay_with_a_different_seed_does_not_match(display, tmp_path, monkeypatch):
+    _, recording = record_run(tmp_path, monkeypatch, seed=13)
+    recording['seed'] += 1
+    assert not run_replay(recording)['matches']
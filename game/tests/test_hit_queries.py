@@ -0,0 +1,138 @@
+# Tests for the attack hit queries: each answer must match a brute-force scan over every live enemy
+import random
+import pygame
+import pytest
+from config import TILESIZE
+from pathfinding import INFINITY
+from sprites import Enemy
+
+CELL = TILESIZE * 2
+
+# Offsets from a hit hash cell border, so enemy boxes start on, just either side of, and a tile across the border
+BORDER_OFFSETS = [-TILESIZE, -0.5, 0, 0.5, TILESIZE - 0.5]
+
+
+@pytest.fixture
+def enemies(game): # Enemies whose top-left corners sit on and around hit hash cell borders
+    placed = []
+    for cell_x in range(2, 6):
+        for cell_y in range(2, 5):
+            for offset_x, offset_y in zip(BORDER_OFFSETS, reversed(BORDER_OFFSETS)):
+                enemy = Enemy(game, 1, 1)
+                enemy.world_x = cell_x * CELL + offset_x
+                enemy.world_y = cell_y * CELL + offset_y
+                placed.append(enemy)
+
+    # An enemy killed after this tick's hash was built is still bucketed there and must never be reported
+    game.sim_tick += 1
+    list(game.enemy_hit_candidates(0, 0, 0, 0))
+    placed.pop().kill()
+    return placed
+
+
+def brute_rect(game, rect): # Every live enemy whose box overlaps rect
+    return {enemy for enemy in game.enemies
+            if enemy.world_x < rect.right and rect.left < enemy.world_x + TILESIZE and
+            enemy.world_y < rect.bottom and rect.top < enemy.world_y + TILESIZE}
+
+
+def brute_radius(game, x, y, radius): # Every live enemy whose box comes closer than radius to (x, y)
+    hits = set()
+    for enemy in game.enemies:
+        nearest_x = min(max(x, enemy.world_x), enemy.world_x + TILESIZE)
+        nearest_y = min(max(y, enemy.world_y), enemy.world_y + TILESIZE)
+        if (nearest_x - x) ** 2 + (nearest_y - y) ** 2 < radius * radius:
+            hits.add(enemy)
+    return hits
+
+
+def entry_t(enemy, start_x, start_y, end_x, end_y, padding): # How far along the segment it first touches the padded box
+    t_enter, t_exit = 0.0, 1.0
+    for origin, delta, low, high in ((start_x, end_x - start_x, enemy.world_x - padding, enemy.world_x + TILESIZE + padding),
+                                     (start_y, end_y - start_y, enemy.world_y - padding, enemy.world_y + TILESIZE + padding)):
+        if delta == 0:
+            if not low < origin < high:
+                return INFINITY
+        else:
+            t_low, t_high = sorted(((low - origin) / delta, (high - origin) / delta))
+            t_enter = max(t_enter, t_low)
+            t_exit = min(t_exit, t_high)
+    return t_enter if t_enter <= t_exit else INFINITY
+
+
+def brute_first_hits(game, start_x, start_y, end_x, end_y, padding): # Every live enemy tied for the earliest touch
+    times = {enemy: entry_t(enemy, start_x, start_y, end_x, end_y, padding) for enemy in game.enemies}
+    first = min(times.values(), default=INFINITY)
+    return {enemy for enemy, t in times.items() if t == first < INFINITY}
+
+
+def border_coordinates(): # Query edges on cell borders, on enemy box edges, and in between
+    return [cell * CELL + offset for cell in range(1, 7) for offset in BORDER_OFFSETS + [TILESIZE / 2, CELL - 1]]
+
+
+def test_enemy_hit_candidates_include_every_enemy_a_query_area_overlaps(game, enemies):
+    rng = random.Random(3)
+    coordinates = border_coordinates()
+    for _ in range(400):
+        left, right = sorted(rng.sample(coordinates, 2))
+        top, bottom = sorted(rng.sample(coordinates, 2))
+        candidates = list(game.enemy_hit_candidates(left, top, right, bottom))
+        assert len(candidates) == len(set(candidates))
+        assert all(enemy.alive() for enemy in candidates)
+        assert brute_rect(game, pygame.Rect(left, top, right - left, bottom - top)) <= set(candidates)
+
+
+def test_enemies_in_rect_matches_a_brute_force_scan(game, enemies):
+    rng = random.Random(4)
+    coordinates = border_coordinates()
+    for _ in range(400):
+        left, top = rng.choice(coordinates), rng.choice(coordinates)
+        rect = pygame.Rect(left, top, rng.choice([1, TILESIZE // 2, TILESIZE, CELL, 3 * CELL]),
+                           rng.choice([1, TILESIZE // 2, TILESIZE, CELL, 3 * CELL]))
+        hits = game.enemies_in_rect(rect)
+        assert len(hits) == len(set(hits))
+        assert set(hits) == brute_rect(game, rect)
+
+
+def test_enemies_in_radius_matches_a_brute_force_scan(game, enemies):
+    rng = random.Random(5)
+    coordinates = border_coordinates()
+    for _ in range(400):
+        x, y = rng.choice(coordinates), rng.choice(coordinates)
+        radius = rng.choice([0.5, TILESIZE / 2, TILESIZE, TILESIZE / 1.5, CELL, 2.5 * CELL])
+        hits = game.enemies_in_radius(x, y, radius)
+        assert len(hits) == len(set(hits))
+        assert set(hits) == brute_radius(game, x, y, radius)
+
+
+@pytest.mark.parametrize('padding', [0, TILESIZE / 2])
+def test_first_enemy_on_segment_matches_a_brute_force_scan(game, enemies, padding):
+    rng = random.Random(6)
+    coordinates = border_coordinates()
+    for _ in range(400):
+        start_x, start_y = rng.choice(coordinates), rng.choice(coordinates)
+        if rng.random() < 0.3:
+            # Axis-aligned segments take the slab test's zero-length branch
+            end_x, end_y = (start_x, rng.choice(coordinates)) if rng.random() < 0.5 else (rng.choice(coordinates), start_y)
+        else:
+            end_x, end_y = rng.choice(coordinates), rng.choice(coordinates)
+        hit = game.first_enemy_on_segment(start_x, start_y, end_x, end_y, padding)
+        expected = brute_first_hits(game, start_x, start_y, end_x, end_y, padding)
+        assert hit in expected if expected else hit is None
+
+
+@pytest.mark.parametrize('padding', [0, TILESIZE / 2])
+def test_a_segment_ending_exactly_on_an_enemy_hits_it(game, enemies, padding):
+    for enemy in game.enemies:
+        # Approach from open floor to the left, stopping on the box's padded left edge
+        start_x = enemy.world_x - padding - 3 * CELL
+        end_x = enemy.world_x - padding
+        y = enemy.world_y + TILESIZE / 2
+        hit = game.first_enemy_on_segment(start_x, y, end_x, y, padding)
+        assert hit in brute_first_hits(game, start_x, y, end_x, y, padding)
+        assert entry_t(hit, start_x, y, end_x, y, padding) <= entry_t(enemy, start_x, y, end_x, y, padding) == 1.0
+
+        # Stopping on the box's centre hits it or something in front of it
+        hit = game.first_enemy_on_segment(start_x, y, enemy.world_x + TILESIZE / 2, y, padding)
+        assert hit is not None
+        assert hit in brute_first_hits(game, start_x, y, enemy.world_x + TILESIZE / 2, y, padding)
@@ -0,0 +1,236 @@
+# Tests for the path search engines, the flow field, the path cache and the request queue
+import random
+import pytest
+import config
+from grid import WalkGrid
+from pathfinding import astar_pathfinding, jps_pathfinding, FlowField, PathCache, IncrementalPlanner, PathRequestQueue
+from conftest import BOSS_MAPS, walkable_tiles
+
+
+def test_flow_field_paths_match_astar_lengths(level_grid):
+    rng = random.Random(3)
+    tiles = walkable_tiles(level_grid)
+    goal = rng.choice(tiles)
+    field = FlowField()
+    field.update(goal, level_grid)
+
+    for start in rng.sample(tiles, 40):
+        if start == goal:
+            continue
+        path = field.path_from(start)
+        assert len(path) == len(astar_pathfinding(start, goal, level_grid))
+        if path:
+            assert path[-1] == goal
+            steps = [start] + path
+            assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(steps, steps[1:]))
+            assert all(level_grid.is_walkable(*tile) for tile in path)
+
+
+def test_flow_field_rebuilds_only_when_goal_or_grid_changes(level_grid):
+    tiles = walkable_tiles(level_grid)
+    field = FlowField()
+    assert field.update(tiles[0], level_grid)
+    assert not field.update(tiles[0], level_grid)
+    assert field.update(tiles[1], level_grid)
+
+    level_grid.set_blocked(*tiles[-1])
+    assert field.update(tiles[1], level_grid)
+    assert field.searches == 3
+
+
+def test_path_cache_reuses_suffixes_of_cached_paths(level_grid):
+    rng = random.Random(5)
+    tiles = walkable_tiles(level_grid)
+    cache = PathCache()
+    for _ in range(10):
+        start, goal = rng.sample(tiles, 2)
+        path = cache.find_path(start, goal, level_grid)
+        if len(path) > 2:
+            break
+
+    hits = cache.hits
+    assert cache.find_path(start, goal, level_grid) == path
+    assert cache.find_path(path[0], goal, level_grid) == path[1:]
+    assert cache.find_path(path[len(path) // 2], goal, level_grid) == path[len(path) // 2 + 1:]
+    assert cache.hits == hits + 3
+
+
+def test_path_cache_misses_after_the_grid_version_changes(level_grid):
+    tiles = walkable_tiles(level_grid)
+    cache = PathCache()
+    start, goal = tiles[0], tiles[-1]
+    cache.find_path(start, goal, level_grid)
+    misses = cache.misses
+
+    # Blocking a tile elsewhere still invalidates every path keyed on the old version
+    level_grid.set_blocked(*tiles[len(tiles) // 2])
+    path = cache.find_path(start, goal, level_grid)
+    assert cache.misses == misses + 1
+    assert len(path) == len(astar_pathfinding(start, goal, level_grid))
+
+
+def test_path_cache_evicts_least_recently_used_paths(level_grid):
+    tiles = walkable_tiles(level_grid)
+    cache = PathCache(max_paths=2)
+
+    # Different goals never share suffixes, so each search stores its own entry
+    start = tiles[-1]
+    first, second, third = tiles[0], tiles[1], tiles[2]
+    cache.find_path(start, first, level_grid)
+    cache.find_path(start, second, level_grid)
+    cache.find_path(start, first, level_grid)
+    cache.find_path(start, third, level_grid)
+
+    assert len(cache.paths) == 2
+    assert all(key[1] != second for key in cache.paths)
+    assert all(owner in cache.paths for owner, _ in cache.tiles.values())
+
+
+def test_jps_paths_are_as_short_as_astar(level_grid):
+    rng = random.Random(7)
+    tiles = walkable_tiles(level_grid)
+    for _ in range(60):
+        start, goal = rng.sample(tiles, 2)
+        jps_path = jps_pathfinding(start, goal, level_grid)
+        assert len(jps_path) == len(astar_pathfinding(start, goal, level_grid))
+        steps = [start] + jps_path
+        assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(steps, steps[1:]))
+        assert all(level_grid.is_walkable(*tile) for tile in jps_path)
+
+
+@pytest.mark.parametrize('boss_map', BOSS_MAPS, ids=[f"boss{index + 1}" for index in range(len(BOSS_MAPS))])
+def test_boss_waves_use_jps_only_if_it_scans_fewer_cells_than_astar(boss_map):
+    grid = WalkGrid.from_tilemap(boss_map)
+    rng = random.Random(11)
+    tiles = walkable_tiles(grid)
+    astar_stats = {}
+    jps_stats = {}
+    for _ in range(100):
+        start, goal = rng.sample(tiles, 2)
+        astar_pathfinding(start, goal, grid, astar_stats)
+        jps_pathfinding(start, goal, grid, jps_stats)
+
+    # Heap pops alone flatter JPS: on a 4-connected grid every horizontal jump also scans vertically from each
+    # cell it passes, so the cells scanned are what decide whether it is the cheaper search
+    assert jps_stats['expanded'] < astar_stats['expanded']
+    if jps_stats['scanned'] >= astar_stats['scanned']:
+        assert config.BOSS_PATHFINDING != 'jps'
+
+
+def chase(grid, rng, steps): # Yield pursuer and goal positions for a random chase with walls toggling along the way
+    tiles = walkable_tiles(grid)
+    start, goal = rng.sample(tiles, 2)
+    for _ in range(steps):
+        roll = rng.random()
+        if start == goal:
+            start = rng.choice(tiles)
+        elif roll < 0.6:
+            path = astar_pathfinding(start, goal, grid)
+            if path:
+                start = path[0]
+        elif roll < 0.9:
+            x, y = goal
+            moves = [tile for tile in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)) if grid.is_walkable(*tile)]
+            if moves:
+                goal = rng.choice(moves)
+        else:
+            tile = rng.choice(tiles)
+            if tile not in (start, goal):
+                grid.set_blocked(*tile, not grid.is_blocked(*tile))
+        yield start, goal
+
+
+def test_incremental_planner_matches_astar_while_everything_moves(level_grid):
+    planner = IncrementalPlanner()
+    for start, goal in chase(level_grid, random.Random(2), 150):
+        path = planner.plan(start, goal, level_grid)
+        assert len(path) == len(astar_pathfinding(start, goal, level_grid))
+        if path:
+            assert path[-1] == goal
+            steps = [start] + path
+            assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(steps, steps[1:]))
+
+
+def test_incremental_planner_repairs_cheaper_than_astar_when_the_goal_moves_every_replan(level_grid):
+    rng = random.Random(4)
+    tiles = walkable_tiles(level_grid)
+    start, goal = rng.sample(tiles, 2)
+    planner = IncrementalPlanner()
+    repaired = searched = 0
+    for step in range(60):
+        x, y = goal
+        goal = rng.choice([tile for tile in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                           if level_grid.is_walkable(*tile)] or [goal])
+
+        before = planner.expanded
+        path = planner.plan(start, goal, level_grid)
+        repaired += planner.expanded - before
+
+        stats = {}
+        assert len(path) == len(astar_pathfinding(start, goal, level_grid, stats))
+        searched += stats.get('expanded', 0)
+
+        # The pursuer steps along its path every other replan, so the search is re-rooted as well as re-aimed
+        if step % 2 and len(path) > 1:
+            start = path[0]
+    assert repaired < searched * 0.6
+
+
+def test_incremental_planner_pursuer_moves_reuse_the_search(level_grid):
+    rng = random.Random(6)
+    tiles = walkable_tiles(level_grid)
+    start, goal = rng.sample(tiles, 2)
+    planner = IncrementalPlanner()
+    path = planner.plan(start, goal, level_grid)
+
+    # Walking down its own path keeps the branch of the search ahead of the pursuer
+    expanded = planner.expanded
+    searched = 0
+    for tile in path[:-1]:
+        assert planner.plan(tile, goal, level_grid) == path[path.index(tile) + 1:]
+        stats = {}
+        astar_pathfinding(tile, goal, level_grid, stats)
+        searched += stats.get('expanded', 0)
+    assert planner.expanded - expanded <= searched / 2
+
+
+def test_path_requests_run_lowest_priority_first_and_merge_duplicates():
+    queue = PathRequestQueue(max_requests=10)
+    answers = []
+    for key, priority in (('far', 9), ('near', 1), ('middle', 5)):
+        queue.submit(key, priority, lambda key=key: [key], answers.append)
+    queue.submit('far', 0, lambda: ['far again'], answers.append)
+    queue.process()
+
+    # The resubmitted request jumps ahead and both of its callers get the first search's answer
+    assert answers == [['far'], ['far'], ['near'], ['middle']]
+    assert queue.completed == 3
+    assert not queue.pending
+
+
+def test_path_requests_answer_a_fixed_count_per_frame():
+    queue = PathRequestQueue(max_requests=2)
+    answers = []
+    for priority in range(5):
+        queue.submit(priority, priority, lambda priority=priority: priority, answers.append)
+
+    queue.process()
+    assert answers == [0, 1]
+    queue.process()
+    assert answers == [0, 1, 2, 3]
+    queue.process()
+    queue.process()
+    assert answers == [0, 1, 2, 3, 4]
+
+
+def test_path_requests_answer_one_request_even_over_the_time_budget():
+    queue = PathRequestQueue(budget_ms=0)
+    answers = []
+    for priority in range(3):
+        queue.submit(priority, priority, lambda priority=priority: priority, answers.append)
+
+    queue.process()
+    assert answers == [0]
+    queue.clear()
+    queue.process()
+    assert answers == [0]
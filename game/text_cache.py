@@ -0,0 +1,42 @@
+# Shared text rendering that keeps one font per size and reuses rendered label surfaces
+import pygame
+from collections import OrderedDict
+
+
+class TextCache: # Initialize an empty font table and a least-recently-used store of rendered labels
+    def __init__(self, max_labels=256):
+        self.max_labels = max_labels
+        self.fonts = {}
+        self.labels = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size): # Return the default font at a size, loading it the first time that size is asked for
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color): # Return an antialiased surface for the text, rendering it only on a cache miss
+        key = (text, size, color)
+        label = self.labels.get(key)
+        if label is not None:
+            self.labels.move_to_end(key)
+            self.hits += 1
+            return label
+
+        self.misses += 1
+        label = self.font(size).render(text, True, color)
+        self.labels[key] = label
+        if len(self.labels) > self.max_labels:
+            self.labels.popitem(last=False)
+        return label
+
+    def stats(self): # Report cache usage so a steady frame can be checked for fresh renders
+        return {
+            'fonts': len(self.fonts),
+            'labels': len(self.labels),
+            'hits': self.hits,
+            'misses': self.misses
+        }